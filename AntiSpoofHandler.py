@@ -1,16 +1,20 @@
 import os
+import time
 import cv2
 import numpy as np
 import warnings
-from src.anti_spoof_predict import AntiSpoofPredict
 from src.generate_patches import CropImage
-from src.utility import parse_model_name
+from src.model_registry import ModelRegistry
 
 warnings.filterwarnings('ignore')
 
 
 class AntiSpoofHandler:
-    def __init__(self, model_dir="./resources/anti_spoof_models", device_id=0, threshold=0.3):
+    BACKENDS = ("torch", "onnx", "int8")
+
+    def __init__(self, model_dir="./resources/anti_spoof_models", device_id=0, threshold=0.3, backend="torch",
+                 hot_reload=True, reload_interval=10.0, cascade=False, cascade_real_margin=0.9,
+                 cascade_fake_margin=0.1, max_sessions=2):
         """
         Initialize Anti-Spoofing Handler
 
@@ -18,15 +22,36 @@ class AntiSpoofHandler:
             model_dir: Path to anti-spoof models directory
             device_id: GPU device ID (0 for CPU)
             threshold: Threshold for real face detection (increased to 0.7 --> 0.5 for better security)
+            backend: "torch" runs the .pth models, "onnx" runs the exported .onnx
+                     models through cv2.dnn without importing torch, "int8" runs
+                     the quantized models written by quantize_models.py on CPU
+            hot_reload: watch model_dir and swap in added/changed/removed models
+            reload_interval: seconds between checks of model_dir when hot_reload is on
+            cascade: run models cheapest first and stop as soon as the averaged real
+                     probability is at or above cascade_real_margin, or at or below
+                     cascade_fake_margin; only ambiguous faces run the whole ensemble
+            max_sessions: independent instances kept per network, i.e. how many
+                          threads can run the same model at the same time
         """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown anti-spoof backend '{backend}', expected one of {self.BACKENDS}")
         self.model_dir = model_dir
         self.device_id = device_id
         self.threshold = threshold
+        self.backend = backend
+        self.hot_reload = hot_reload
+        self.reload_interval = reload_interval
+        self.cascade = cascade
+        self.cascade_real_margin = cascade_real_margin
+        self.cascade_fake_margin = cascade_fake_margin
+        self.model_costs = {}  # model name -> moving average of crop + forward seconds
+        self.max_sessions = max_sessions
         self.debug_mode = True  # Enable debug logging
 
         # Initialize components
         self.model_test = None
         self.image_cropper = None
+        self.model_registry = None
         self.models_loaded = False
 
         # Try to initialize models
@@ -41,51 +66,94 @@ class AntiSpoofHandler:
                 print(f"ERROR: Model directory does not exist: {self.model_dir}")
                 return
 
-            model_files = [f for f in os.listdir(self.model_dir) if f.endswith('.pth')]
+            self.model_test = self._create_predictor()
+            self.image_cropper = CropImage()
+
+            # Scan once; models are warmed by the registry before they are published
+            self.model_registry = ModelRegistry(
+                self.model_dir,
+                artifact_path=self.model_test.artifact_path,
+                on_load=lambda spec: self.model_test.preload([spec.path], spec.mtime),
+                on_unload=lambda spec: self.model_test.unload(spec.path, spec.mtime),
+                poll_interval=self.reload_interval
+            )
+            self.model_registry.refresh()
+            model_files = [spec.name for spec in self.model_registry.models()]
             print(f"Found model files: {model_files}")
 
             if not model_files:
                 print("ERROR: No .pth model files found in directory")
                 return
 
-            self.model_test = AntiSpoofPredict(self.device_id)
-            self.image_cropper = CropImage()
+            if self.hot_reload:
+                self.model_registry.start_watching()
             self.models_loaded = True
             print(f"✓ Anti-spoofing models loaded successfully from {self.model_dir}")
-            print(f"✓ Using threshold: {self.threshold}")
+            print(f"✓ Using threshold: {self.threshold} ({self.backend} backend)")
 
         except Exception as e:
             print(f"ERROR initializing anti-spoof models: {e}")
             import traceback
             traceback.print_exc()
 
-    def is_real_face(self, image):
+    def _create_predictor(self):
+        # Import lazily so the onnx backend never pulls in torch
+        if self.backend == "onnx":
+            from src.anti_spoof_predict_dnn import AntiSpoofPredictDNN
+            return AntiSpoofPredictDNN(self.device_id, max_sessions=self.max_sessions)
+        from src.anti_spoof_predict import AntiSpoofPredict
+        return AntiSpoofPredict(self.device_id, quantized=self.backend == "int8", max_sessions=self.max_sessions)
+
+    def is_real_face(self, image, face=None):
         """
         Check if the face in the image is real (not spoofed)
 
         Args:
             image: OpenCV image (BGR format)
+            face: optional DetectedFace from FaceDetector, skips re-detection
 
         Returns:
             tuple: (is_real: bool, confidence: float, error_msg: str or None)
         """
+        is_real, confidence, error, _ = self._evaluate_face(image, face)
+        return is_real, confidence, error
+
+    def _ordered_models(self):
+        models = self.model_registry.models()
+        if not self.cascade:
+            return models
+        # Cheapest first; models never timed yet go first so they get measured
+        return sorted(models, key=lambda spec: self.model_costs.get(spec.name, 0.0))
+
+    def _record_cost(self, model_name, seconds):
+        previous = self.model_costs.get(model_name)
+        self.model_costs[model_name] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def _is_decisive(self, prediction, model_count):
+        real_probability = prediction[0][1] / model_count
+        return real_probability >= self.cascade_real_margin or real_probability <= self.cascade_fake_margin
+
+    def _evaluate_face(self, image, face=None):
+        """Same as is_real_face, plus the names of the models that actually ran"""
+        models_run = []
+
         if not self.models_loaded:
             print("WARNING: Anti-spoofing models not loaded - treating as FAKE for security")
-            return False, 0.0, "Anti-spoofing disabled - assuming fake"
+            return False, 0.0, "Anti-spoofing disabled - assuming fake", models_run
 
         try:
             # Validate image
             if image is None or image.size == 0:
                 if self.debug_mode:
                     print("DEBUG: Invalid image provided")
-                return False, 0.0, "Invalid image"
+                return False, 0.0, "Invalid image", models_run
 
             # Get face bounding box
-            image_bbox = self.model_test.get_bbox(image)
+            image_bbox = face.bbox if face is not None else self.model_test.get_bbox(image)
             if image_bbox is None:
                 if self.debug_mode:
                     print("DEBUG: No face detected for anti-spoofing")
-                return False, 0.0, "No face detected for anti-spoofing"
+                return False, 0.0, "No face detected for anti-spoofing", models_run
 
             if self.debug_mode:
                 print(f"DEBUG: Face bbox detected: {image_bbox}")
@@ -94,46 +162,51 @@ class AntiSpoofHandler:
             prediction = np.zeros((1, 3))
             model_count = 0
 
-            # Process each model in the directory
-            model_files = [f for f in os.listdir(self.model_dir) if f.endswith('.pth')]
-
-            for model_name in model_files:
+            # Process each registered model
+            for spec in self._ordered_models():
                 try:
                     if self.debug_mode:
-                        print(f"DEBUG: Processing model: {model_name}")
-
-                    h_input, w_input, model_type, scale = parse_model_name(model_name)
+                        print(f"DEBUG: Processing model: {spec.name}")
 
+                    start = time.perf_counter()
                     param = {
                         "org_img": image,
                         "bbox": image_bbox,
-                        "scale": scale,
-                        "out_w": w_input,
-                        "out_h": h_input,
+                        "scale": spec.scale,
+                        "out_w": spec.w_input,
+                        "out_h": spec.h_input,
                         "crop": True,
                     }
 
-                    if scale is None:
+                    if spec.scale is None:
                         param["crop"] = False
 
                     # Crop image for model input
                     img = self.image_cropper.crop(**param)
 
                     # Get prediction from model
-                    model_prediction = self.model_test.predict(img, os.path.join(self.model_dir, model_name))
+                    model_prediction = self.model_test.predict(img, spec.path, spec.mtime)
+                    self._record_cost(spec.name, time.perf_counter() - start)
                     prediction += model_prediction
                     model_count += 1
+                    models_run.append(spec.name)
 
                     if self.debug_mode:
-                        print(f"DEBUG: Model {model_name} prediction: {model_prediction}")
+                        print(f"DEBUG: Model {spec.name} prediction: {model_prediction}")
 
                 except Exception as e:
-                    print(f"ERROR processing model {model_name}: {e}")
+                    print(f"ERROR processing model {spec.name}: {e}")
                     continue
 
+                # Clear-cut faces don't need the rest of the ensemble
+                if self.cascade and self._is_decisive(prediction, model_count):
+                    if self.debug_mode:
+                        print(f"DEBUG: Cascade stopped after {models_run}")
+                    break
+
             if model_count == 0:
                 print("ERROR: No models processed successfully")
-                return False, 0.0, "No models processed"
+                return False, 0.0, "No models processed", models_run
 
             # Analyze results
             label = np.argmax(prediction)
@@ -151,31 +224,108 @@ class AntiSpoofHandler:
             if self.debug_mode:
                 print(f"DEBUG: Result - Real: {is_real}")
 
-            return is_real, float(confidence), None
+            return is_real, float(confidence), None, models_run
 
         except Exception as e:
             print(f"ERROR in anti-spoofing: {e}")
             import traceback
             traceback.print_exc()
             # Return False for security - if there's an error, assume it's fake
-            return False, 0.0, f"Error: {str(e)}"
+            return False, 0.0, f"Error: {str(e)}", models_run
 
-    def check_frame_authenticity(self, frame):
+    def predict_batch(self, image):
+        """
+        Check every face in the image in one forward pass per model
+
+        Args:
+            image: OpenCV image (BGR format)
+
+        Returns:
+            list: one dict per detected face, best detection first: {
+                'bbox': [x, y, w, h],
+                'detector_confidence': float,
+                'is_authentic': bool,
+                'confidence': float,
+                'label': int
+            }
+        """
+        if not self.models_loaded:
+            print("WARNING: Anti-spoofing models not loaded - treating as FAKE for security")
+            return []
+
+        if image is None or image.size == 0:
+            if self.debug_mode:
+                print("DEBUG: Invalid image provided")
+            return []
+
+        try:
+            detections = self.model_test.get_bboxes(image)
+            if not detections:
+                if self.debug_mode:
+                    print("DEBUG: No face detected for anti-spoofing")
+                return []
+
+            prediction = np.zeros((len(detections), 3))
+            model_count = 0
+
+            for spec in self.model_registry.models():
+                try:
+                    crops = [
+                        self.image_cropper.crop(org_img=image, bbox=bbox, scale=spec.scale,
+                                                out_w=spec.w_input, out_h=spec.h_input, crop=spec.scale is not None)
+                        for bbox, _ in detections
+                    ]
+                    prediction += self.model_test.predict_batch(crops, spec.path, spec.mtime)
+                    model_count += 1
+                except Exception as e:
+                    print(f"ERROR processing model {spec.name}: {e}")
+                    continue
+
+            if model_count == 0:
+                print("ERROR: No models processed successfully")
+                return []
+
+            results = []
+            for (bbox, det_conf), face_prediction in zip(detections, prediction):
+                label = int(np.argmax(face_prediction))
+                confidence = float(face_prediction[label] / model_count)
+                results.append({
+                    'bbox': bbox,
+                    'detector_confidence': det_conf,
+                    'is_authentic': label == 1 and confidence >= self.threshold,
+                    'confidence': confidence,
+                    'label': label
+                })
+
+            if self.debug_mode:
+                print(f"DEBUG: Batch anti-spoof results for {len(results)} faces: {results}")
+
+            return results
+
+        except Exception as e:
+            print(f"ERROR in batch anti-spoofing: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    def check_frame_authenticity(self, frame, face=None):
         """
         Convenience method to check frame authenticity
 
         Args:
             frame: OpenCV frame
+            face: optional DetectedFace from FaceDetector, skips re-detection
 
         Returns:
             dict: {
                 'is_authentic': bool,
                 'confidence': float,
                 'status': str,
-                'error': str or None
+                'error': str or None,
+                'models_run': list of model names that were evaluated
             }
         """
-        is_real, confidence, error = self.is_real_face(frame)
+        is_real, confidence, error, models_run = self._evaluate_face(frame, face)
 
         if error and "disabled" not in error.lower():
             status = "error"
@@ -191,7 +341,8 @@ class AntiSpoofHandler:
             'is_authentic': is_real,
             'confidence': confidence,
             'status': status,
-            'error': error
+            'error': error,
+            'models_run': models_run
         }
 
     def test_with_sample_image(self, image_path):
@@ -213,16 +364,25 @@ class AntiSpoofHandler:
         self.debug_mode = enable
         print(f"Debug mode {'enabled' if enable else 'disabled'}")
 
+    def reload_models(self):
+        """Rescan the model directory now instead of waiting for the watcher"""
+        if self.model_registry is None:
+            return False
+        return self.model_registry.refresh()
+
     def get_model_info(self):
         """Get information about loaded models"""
         if not self.models_loaded:
             return "Models not loaded"
 
-        model_files = [f for f in os.listdir(self.model_dir) if f.endswith('.pth')]
+        model_files = [spec.name for spec in self.model_registry.models()]
         return {
             'models_loaded': self.models_loaded,
             'model_count': len(model_files),
             'model_files': model_files,
             'threshold': self.threshold,
-            'model_dir': self.model_dir
+            'model_dir': self.model_dir,
+            'backend': self.backend,
+            'cascade': self.cascade,
+            'model_costs_ms': {name: cost * 1000 for name, cost in self.model_costs.items()}
         }
\ No newline at end of file
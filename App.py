@@ -9,10 +9,23 @@ from RecognitionHandler import RecognitionHandler
 from RegistrationHandler import RegistrationHandler
 from TimerManager import TimerManager
 from WebcamManager import WebcamManager
+from CaptureManager import CaptureManager
 from AntiSpoofHandler import AntiSpoofHandler
+from FaceDetector import FaceDetector
+from UserDirectory import UserDirectory
+from GalleryStore import GalleryStore
 
 class App:
-    def __init__(self):
+    def __init__(self, sources=None, preview_stream=None, monitor_stream=None, profile='default'):
+        """
+        sources: optional {name: camera index / RTSP URL / video file} (or a list) to
+                 capture in this process; without it the default webcam is used
+        preview_stream: which of those streams the main window shows and login/logout
+                        read (default: the first)
+        monitor_stream: which stream the presence timer watches (default: the preview);
+                        streams that are neither are not opened
+        profile: util.DETECTION_PROFILES name used by detection and encoding
+        """
         self.main_window = tk.Tk()
         screen_width = self.main_window.winfo_screenwidth()
         screen_height = self.main_window.winfo_screenheight()
@@ -29,17 +42,18 @@ class App:
         if not os.path.exists(self.users_file_path) or os.path.getsize(self.users_file_path) == 0:
             with open(self.users_file_path, 'w') as f:
                 json.dump({}, f)
+        self.user_directory = UserDirectory(self.users_file_path)
+        self.gallery_store = GalleryStore(self.db_dir)
         self.log_path = './log.txt'
         self.current_user = None
         self.logged_in_emp_ids = set()
 
-        # Load known faces - FIXED: properly pass all three parameters
-        known_encodings, known_names, multi_encodings_dict = util.load_known_faces(self.db_dir)
+        # Known faces are loaded by the handler, from the gallery store when there is one
         self.recognition_handler = RecognitionHandler(
             self.db_dir,
-            known_encodings,
-            known_names,  # This was missing before
-            multi_encodings_dict
+            user_directory=self.user_directory,
+            gallery_store=self.gallery_store,
+            profile=profile
         )
 
         # Replace the threshold to be more strict
@@ -48,8 +62,27 @@ class App:
         # Add this after creating anti_spoof_handler to enable debug mode
         self.anti_spoof_handler.enable_debug(True)
 
-        # Webcam manager
-        self.webcam = WebcamManager()
+        # One detection pass per frame, shared by recognition and anti-spoofing
+        shared_detector = self.anti_spoof_handler.model_test if self.anti_spoof_handler.models_loaded else None
+        self.face_detector = FaceDetector(shared_detector, profile=profile)
+
+        # Webcam manager, previewing one stream of the capture manager when there are several
+        self.capture_manager = None
+        monitor = None
+        if sources:
+            self.capture_manager = CaptureManager(sources)
+            preview_stream = preview_stream or next(iter(self.capture_manager.streams))
+            monitor_stream = monitor_stream or preview_stream
+            # only open the streams something reads from
+            used = [preview_stream] if monitor_stream == preview_stream else [preview_stream, monitor_stream]
+            unused = [name for name in self.capture_manager.streams if name not in used]
+            if unused:
+                print(f"Streams without a consumer, not started: {unused}")
+            self.capture_manager.start(used)
+            self.webcam = WebcamManager(stream=self.capture_manager.stream(preview_stream))
+            monitor = self.capture_manager.stream(monitor_stream)
+        else:
+            self.webcam = WebcamManager()
 
         # UI Buttons
         self.login_handler = LoginHandler(self, self.recognition_handler, self.log_path)
@@ -78,7 +111,14 @@ class App:
         self.label_total_missed.place(x=750, y=90)
 
         # Timer manager
-        self.timer_manager = TimerManager(self, self.recognition_handler, self.users_file_path)
+        self.timer_manager = TimerManager(self, self.recognition_handler, self.users_file_path, stream=monitor)
+
+        # Capture health of the streams, when there are several
+        self._last_health = None
+        if self.capture_manager:
+            self.label_streams = tk.Label(self.main_window, text="", font=("Helvetica", 9), anchor='w')
+            self.label_streams.place(x=10, y=500, width=700)
+            self._update_stream_health()
 
         # Window close
         self.main_window.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -94,9 +134,22 @@ class App:
             self.label_emp_id.destroy()
             del self.label_emp_id
 
+    def _update_stream_health(self):
+        report = [health for health in self.capture_manager.health_report() if health['status'] != 'stopped']
+        summary = "  |  ".join(f"{health['name']}: {health['status']} {health['fps']} fps" for health in report)
+        self.label_streams.config(text=summary)
+        # log the full report when a stream's status changes to something other than ok
+        statuses = tuple(health['status'] for health in report)
+        if statuses != self._last_health and any(status != 'ok' for status in statuses):
+            self.capture_manager.print_health()
+        self._last_health = statuses
+        self.main_window.after(5000, self._update_stream_health)
+
     def on_closing(self):
         self.timer_manager.stop()
         self.webcam.stop()
+        if self.capture_manager:
+            self.capture_manager.stop()
         self.main_window.destroy()
 
     def start(self):
@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from FrameBus import Frame, FrameBus  # noqa: F401 - Frame re-exported for callers
+
+
+def parse_source(source):
+    """'0' -> camera index 0; RTSP/HTTP URLs and file paths are passed through"""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class CaptureStream:
+    """
+    One video source (camera index, RTSP URL or video file) read on its own
+    worker thread and published on a FrameBus, newest frame wins.
+    """
+
+    def __init__(self, name, source, buffer_size=4, reconnect_after=25, reconnect_delay=2.0, loop_files=True,
+                 stall_after=5.0):
+        """
+        Args:
+            name: stream name used by subscribers and the health report
+            source: camera index, URL or video file path
+            buffer_size: frames kept in the ring buffer
+            reconnect_after: consecutive failed reads before the source is reopened
+            reconnect_delay: seconds to wait before reopening
+            loop_files: rewind video files at the end instead of stopping,
+                        they are also paced at their native frame rate
+            stall_after: seconds without a new frame before health reports 'stalled'
+        """
+        self.name = name
+        self.source = parse_source(source)
+        self.reconnect_after = reconnect_after
+        self.reconnect_delay = reconnect_delay
+        self.loop_files = loop_files
+        self.stall_after = stall_after
+
+        self.bus = FrameBus(name, buffer_size)
+        self.running = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.frames_read = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.status = 'stopped'
+        self._fps_window = deque(maxlen=30)
+
+    @property
+    def latest(self):
+        """Newest Frame, Frame(0, None, None) before the first capture"""
+        return self.bus.latest
+
+    @property
+    def frames(self):
+        return self.bus.frames
+
+    @property
+    def is_file(self):
+        return isinstance(self.source, str) and '://' not in self.source
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._stop_event.clear()
+        if self._thread is not None and self._thread.is_alive():
+            # the previous reader is still blocked in cap.read() and carries on,
+            # a second one would open the same source again
+            return
+        self._thread = threading.Thread(target=self._capture_loop, name=f"capture-{self.name}", daemon=True)
+        self._thread.start()
+
+    def request_stop(self):
+        """Tell the capture thread to exit without waiting for it"""
+        self.running = False
+        self._stop_event.set()
+
+    def stop(self, timeout=1.0):
+        self.request_stop()
+        if self._thread:
+            self._thread.join(timeout)
+            # a stalled source can keep the thread in cap.read() past the timeout
+            if not self._thread.is_alive():
+                self._thread = None
+
+    def subscribe(self, callback):
+        """callback(stream_name, Frame) runs on the capture thread for every frame, keep it short"""
+        self.bus.subscribe(callback)
+
+    def unsubscribe(self, callback):
+        self.bus.unsubscribe(callback)
+
+    def _open(self):
+        self.status = 'connecting'
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            self.status = 'unavailable'
+            return None, 0.0
+        self.status = 'ok'
+        frame_interval = 0.0
+        if self.is_file:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        return cap, frame_interval
+
+    def _capture_loop(self):
+        cap, frame_interval = self._open()
+        consecutive_failures = 0
+        rewound = False
+        try:
+            while self.running:
+                if cap is None:
+                    if self._stop_event.wait(self.reconnect_delay):
+                        break
+                    cap, frame_interval = self._open()
+                    self.reconnects += 1
+                    continue
+
+                started = time.time()
+                ret, image = cap.read()
+                if not ret:
+                    if self.is_file and self.loop_files and self.frames_read and not rewound:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        rewound = True
+                        continue
+                    self.failures += 1
+                    consecutive_failures += 1
+                    if consecutive_failures >= self.reconnect_after:
+                        print(f"Stream {self.name}: no frames from {self.source}, reconnecting")
+                        cap.release()
+                        cap = None
+                        consecutive_failures = 0
+                    else:
+                        time.sleep(0.05)
+                    continue
+
+                consecutive_failures = 0
+                rewound = False
+                self.status = 'ok'
+                self.frames_read += 1
+                frame = self.bus.publish(image)
+                self._fps_window.append(frame.timestamp)
+
+                if frame_interval:
+                    # play files back in real time rather than as fast as they decode
+                    time.sleep(max(0.0, frame_interval - (time.time() - started)))
+        finally:
+            if cap is not None:
+                cap.release()
+            self.status = 'stopped'
+
+    def fps(self):
+        window = list(self._fps_window)
+        if len(window) < 2 or window[-1] == window[0]:
+            return 0.0
+        return (len(window) - 1) / (window[-1] - window[0])
+
+    def health(self):
+        latest = self.latest
+        age = time.time() - latest.timestamp if latest.timestamp else None
+        status = self.status
+        if status == 'ok' and age is not None and age > self.stall_after:
+            status = 'stalled'
+        return {
+            'name': self.name,
+            'source': self.source,
+            'status': status,
+            'fps': round(self.fps(), 1),
+            'frames': self.frames_read,
+            'failures': self.failures,
+            'reconnects': self.reconnects,
+            'last_frame_age': None if age is None else round(age, 2),
+        }
+
+
+class CaptureManager:
+    """
+    Runs several CaptureStreams in one process, so a dozen cameras share a
+    single load of the recognition and anti-spoof models.
+    """
+
+    def __init__(self, sources=None, buffer_size=4):
+        """
+        Args:
+            sources: {name: source} or a list of sources (named by position as 'cam0', 'cam1', ...)
+            buffer_size: frames kept per stream
+        """
+        self.buffer_size = buffer_size
+        self.streams = {}
+        if isinstance(sources, dict):
+            for name, source in sources.items():
+                self.add_source(name, source)
+        else:
+            for index, source in enumerate(sources or []):
+                self.add_source(f"cam{index}", source)
+
+    def add_source(self, name, source, start=False):
+        if name in self.streams:
+            raise ValueError(f"Stream {name} already exists")
+        stream = CaptureStream(name, source, self.buffer_size)
+        self.streams[name] = stream
+        if start:
+            stream.start()
+        return stream
+
+    def remove_source(self, name):
+        stream = self.streams.pop(name, None)
+        if stream:
+            stream.stop()
+
+    def stream(self, name):
+        return self.streams[name]
+
+    def start(self, names=None):
+        """Start the given streams (default: all)"""
+        for name in names or self.streams:
+            self.streams[name].start()
+
+    def stop(self):
+        # signal every stream first so they shut down in parallel
+        for stream in self.streams.values():
+            stream.request_stop()
+        for stream in self.streams.values():
+            stream.stop()
+
+    def get_latest(self, name):
+        """Newest Frame of a stream, non-blocking"""
+        return self.streams[name].latest
+
+    def subscribe(self, name, callback):
+        self.streams[name].subscribe(callback)
+
+    def unsubscribe(self, name, callback):
+        self.streams[name].unsubscribe(callback)
+
+    def health_report(self):
+        return [stream.health() for stream in self.streams.values()]
+
+    def print_health(self):
+        for health in self.health_report():
+            age = '-' if health['last_frame_age'] is None else f"{health['last_frame_age']}s"
+            print(f"{health['name']:<10} {health['status']:<12} {health['fps']:>5} fps  "
+                  f"frames {health['frames']:<8} failures {health['failures']:<5} "
+                  f"reconnects {health['reconnects']:<3} last frame {age}  ({health['source']})")
@@ -0,0 +1,92 @@
+import threading
+
+import face_recognition
+
+import util
+from FrameBus import as_frame
+from FrameCache import FrameCache
+from src.detection import Detection
+
+
+class DetectedFace:
+    """A face found in a frame, shared by recognition and anti-spoofing"""
+
+    def __init__(self, frame, rgb_frame, bbox, confidence, profile=None):
+        self.frame = frame
+        self.rgb_frame = rgb_frame
+        self.bbox = bbox  # [x, y, w, h] as used by CropImage
+        self.confidence = confidence
+        self.profile = util.get_profile(profile)
+
+        # (top, right, bottom, left) as used by face_recognition, clipped to the frame
+        height, width = frame.shape[:2]
+        x, y, w, h = bbox
+        self.location = (max(y, 0), min(x + w, width), min(y + h, height), max(x, 0))
+
+        self._landmarks = None
+        self._encoding = None
+        # callers sharing this face (via the per-frame cache) compute each lazy value once
+        self._lock = threading.Lock()
+
+    @property
+    def landmarks(self):
+        with self._lock:
+            if self._landmarks is None:
+                landmarks = face_recognition.face_landmarks(self.rgb_frame, [self.location])
+                self._landmarks = landmarks[0] if landmarks else {}
+        return self._landmarks
+
+    @property
+    def encoding(self):
+        # Computed on first use only - liveness-only callers never pay for it
+        with self._lock:
+            if self._encoding is None:
+                encodings = util.encode_faces(self.rgb_frame, [self.location], self.profile)
+                if encodings:
+                    self._encoding = encodings[0]
+        return self._encoding
+
+
+class FaceDetector:
+    """Runs face detection once per frame for every consumer"""
+
+    def __init__(self, detector=None, cache_size=8, profile='default'):
+        """
+        detector: RetinaFace Detection, reuse the anti-spoof one when there is one
+        profile: util.DETECTION_PROFILES name (or DetectionProfile); its
+                 input_size/confidence configure RetinaFace and its
+                 landmarks/jitters the encoding
+        """
+        self.detector = detector or Detection()
+        self.profile = util.get_profile(profile)
+        self.cache = FrameCache(cache_size)
+
+    def detect(self, frame, seq=None):
+        """
+        Detect all faces in a frame
+
+        Args:
+            frame: Frame (uses its cached RGB conversion) or BGR array
+            seq: frame sequence number, defaults to the Frame's; when given,
+                 callers asking about the same frame of the same stream share
+                 one detection (and the faces' lazy encodings)
+
+        Returns:
+            list: DetectedFace objects, most confident first
+        """
+        if frame is None:
+            return []
+        frame = as_frame(frame)
+        if frame.image is None or frame.image.size == 0:
+            return []
+        if seq is None:
+            seq = frame.seq
+        if seq is not None:
+            # seq restarts at 1 on every stream, so it alone does not identify a frame
+            return self.cache.get_or_compute((frame.stream, seq), lambda: self._detect(frame))
+        return self._detect(frame)
+
+    def _detect(self, frame):
+        detections = self.detector.get_bboxes(frame.image, self.profile.input_size, self.profile.confidence)
+        return [DetectedFace(frame.image, frame.rgb, bbox, confidence, self.profile)
+                for bbox, confidence in detections]
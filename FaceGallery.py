@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+import numpy as np
+
+ENCODING_SIZE = 128
+
+# name: best matching label, distance: its euclidean distance,
+# margin: gap to the closest encoding of a *different* label (inf if there is none)
+FaceMatch = namedtuple('FaceMatch', ['name', 'distance', 'margin'])
+
+
+class FaceGallery:
+    """
+    All known face encodings as one contiguous float32 (N, 128) matrix with a
+    parallel label array, so a probe is matched with a single vectorized
+    distance computation instead of a Python loop over users.
+    """
+
+    # match() measures margin against every other row
+    exact_margin = True
+
+    def __init__(self, encodings=None, labels=None):
+        if encodings is None or len(encodings) == 0:
+            self._snapshot = (np.empty((0, ENCODING_SIZE), dtype=np.float32), np.empty(0, dtype=object))
+            return
+
+        if labels is None or len(labels) != len(encodings):
+            raise ValueError("encodings and labels must have the same length")
+        self._snapshot = (self._as_matrix(encodings), np.array(labels, dtype=object))
+
+    @staticmethod
+    def _as_matrix(encodings):
+        return np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE))
+
+    # Matrix and labels are always swapped together as one tuple, so a match
+    # running on another thread never sees them out of step during add/remove
+    @property
+    def encodings(self):
+        return self._snapshot[0]
+
+    @property
+    def labels(self):
+        return self._snapshot[1]
+
+    @classmethod
+    def from_multi(cls, multi_encodings_dict):
+        """Build from {name: [encoding, ...]}, one row per stored encoding"""
+        encodings, labels = [], []
+        for name, user_encodings in multi_encodings_dict.items():
+            for encoding in user_encodings or []:
+                encodings.append(encoding)
+                labels.append(name)
+        return cls(encodings, labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return bool(np.any(self.labels == label))
+
+    def add(self, label, encodings):
+        """Add (or replace) all encodings of one label"""
+        matrix = self._as_matrix(encodings)
+        current, labels = self._snapshot
+        keep = labels != label
+        self._snapshot = (np.concatenate([current[keep], matrix]),
+                          np.concatenate([labels[keep], np.full(len(matrix), label, dtype=object)]))
+
+    def remove(self, label):
+        current, labels = self._snapshot
+        keep = labels != label
+        self._snapshot = (np.ascontiguousarray(current[keep]), labels[keep])
+
+    def encodings_for(self, label):
+        """All rows stored for one label"""
+        matrix, labels = self._snapshot
+        return matrix[labels == label]
+
+    @staticmethod
+    def _distances(matrix, encoding):
+        diff = matrix - np.asarray(encoding, dtype=np.float32)
+        return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+    def distances(self, encoding):
+        """Euclidean distance from encoding to every row (same metric as face_recognition.face_distance)"""
+        return self._distances(self.encodings, encoding)
+
+    def match(self, encoding, tolerance, inclusive=True):
+        """
+        Find the closest known face
+
+        Args:
+            encoding: 128-d probe encoding
+            tolerance: maximum distance that still counts as a match
+            inclusive: distance == tolerance matches (like face_recognition.compare_faces);
+                       False for the strict distance < tolerance checks
+
+        Returns:
+            FaceMatch or None if nothing is within tolerance
+        """
+        matrix, labels = self._snapshot
+        if len(labels) == 0:
+            return None
+
+        distances = self._distances(matrix, encoding)
+        best_index = int(np.argmin(distances))
+        best_distance = float(distances[best_index])
+        if best_distance > tolerance or (not inclusive and best_distance == tolerance):
+            return None
+
+        best_name = labels[best_index]
+        others = distances[labels != best_name]
+        margin = float(others.min()) - best_distance if len(others) else float('inf')
+        return FaceMatch(best_name, best_distance, margin)
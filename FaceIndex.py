@@ -0,0 +1,235 @@
+import threading
+
+import numpy as np
+
+from FaceGallery import ENCODING_SIZE, FaceMatch
+
+
+class IVFFaceIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index over face encodings,
+    for galleries too large for FaceGallery's brute-force scan.
+
+    Encodings are clustered with k-means into n_lists cells. A probe only scans
+    the rows of its nprobe closest cells, using a float16 copy of the matrix,
+    and the rerank_k closest candidates are then re-ranked with exact float32
+    distances before the tolerance is applied. Same add/remove/match interface
+    as FaceGallery, so the two are interchangeable.
+    """
+
+    # match() measures margin over the probed cells only, from float16 distances
+    exact_margin = False
+
+    def __init__(self, encodings=None, labels=None, n_lists=None, nprobe=8, rerank_k=32, seed=0):
+        """
+        Args:
+            encodings, labels: initial rows, as for FaceGallery
+            n_lists: number of k-means cells (default: sqrt of the gallery size)
+            nprobe: cells scanned per probe; higher is slower with better recall
+            rerank_k: candidates re-ranked with exact distances
+            seed: k-means initialisation seed
+        """
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.rerank_k = rerank_k
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+
+        self._exact = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self._coarse = np.empty((0, ENCODING_SIZE), dtype=np.float16)
+        self._labels = np.empty(0, dtype=object)
+        self._alive = np.empty(0, dtype=bool)
+        self._count = 0
+        self._dead = 0
+        self._rows_by_label = {}
+
+        self.centroids = None
+        self._lists = []
+        self._trained_size = 0
+
+        if encodings is not None and len(encodings):
+            if labels is None or len(labels) != len(encodings):
+                raise ValueError("encodings and labels must have the same length")
+            matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+            self._exact = matrix
+            self._labels = np.array(labels, dtype=object)
+            self._alive = np.ones(len(matrix), dtype=bool)
+            self._count = len(matrix)
+            self.train()
+
+    def __len__(self):
+        return self._count - self._dead
+
+    def __contains__(self, label):
+        return label in self._rows_by_label
+
+    @property
+    def encodings(self):
+        with self._lock:
+            return self._exact[:self._count][self._alive[:self._count]]
+
+    @property
+    def labels(self):
+        with self._lock:
+            return self._labels[:self._count][self._alive[:self._count]]
+
+    def encodings_for(self, label):
+        """All rows stored for one label"""
+        with self._lock:
+            rows = self._rows_by_label.get(label)
+            if rows is None:
+                return np.empty((0, ENCODING_SIZE), dtype=np.float32)
+            return self._exact[rows]
+
+    def _append(self, label, matrix):
+        end = self._count + len(matrix)
+        if end > len(self._exact):
+            capacity = max(end, 2 * len(self._exact), 1024)
+            self._exact = np.resize(self._exact, (capacity, ENCODING_SIZE))
+            self._coarse = np.resize(self._coarse, (capacity, ENCODING_SIZE))
+            self._labels = np.resize(self._labels, capacity)
+            self._alive = np.resize(self._alive, capacity)
+        rows = np.arange(self._count, end)
+        self._exact[rows] = matrix
+        self._coarse[rows] = matrix
+        self._labels[rows] = label
+        self._alive[rows] = True
+        self._count = end
+        self._rows_by_label[label] = rows
+        return rows
+
+    def _nearest_centroids(self, matrix, chunk=8192):
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, |x|^2 is the same for every c so it is dropped
+        centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        assign = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), chunk):
+            block = matrix[start:start + chunk]
+            assign[start:start + chunk] = np.argmin(centroid_norms - 2 * block @ self.centroids.T, axis=1)
+        return assign
+
+    def _kmeans(self, matrix, n_lists, iterations=10):
+        sample_size = min(len(matrix), 64 * n_lists)
+        sample = matrix[self._rng.choice(len(matrix), sample_size, replace=False)]
+        self.centroids = sample[self._rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._nearest_centroids(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            filled = counts > 0
+            # empty cells keep their previous centroid
+            self.centroids[filled] = sums[filled] / counts[filled, None]
+
+    def train(self):
+        """(Re)build the cells from the live rows, also drops removed rows"""
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._count])
+            labels = self._labels[live]
+            matrix = self._exact[live].copy()
+
+            self._exact = matrix
+            self._coarse = matrix.astype(np.float16)
+            self._labels = labels
+            self._alive = np.ones(len(live), dtype=bool)
+            self._count = len(live)
+            self._dead = 0
+            self._rows_by_label = {}
+            for row, label in enumerate(labels):
+                self._rows_by_label.setdefault(label, []).append(row)
+            self._rows_by_label = {label: np.array(rows) for label, rows in self._rows_by_label.items()}
+
+            if self._count == 0:
+                self.centroids = None
+                self._lists = []
+                self._trained_size = 0
+                return
+
+            n_lists = min(self.n_lists or max(1, int(np.sqrt(self._count))), self._count)
+            self._kmeans(matrix, n_lists)
+            assign = self._nearest_centroids(matrix)
+            order = np.argsort(assign, kind='stable')
+            bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(n_lists)]
+            self._trained_size = self._count
+
+    def add(self, label, encodings):
+        """Add (or replace) all encodings of one label"""
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        with self._lock:
+            self.remove(label)
+            rows = self._append(label, matrix)
+            if self.centroids is None or self._count > 2 * self._trained_size:
+                # the cells were fitted to a much smaller gallery, refit them
+                self.train()
+                return
+            for row, cell in zip(rows, self._nearest_centroids(matrix)):
+                self._lists[cell] = np.append(self._lists[cell], row)
+
+    def remove(self, label):
+        with self._lock:
+            rows = self._rows_by_label.pop(label, None)
+            if rows is None:
+                return
+            self._alive[rows] = False
+            self._dead += len(rows)
+            # removed rows are only skipped at search time until enough pile up
+            if self._dead > self._count // 4:
+                self.train()
+
+    def nearest_other_distance(self, encoding, label, chunk=65536):
+        """Exact distance from encoding to the closest live row of any other label (full scan)"""
+        probe = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            best = np.inf
+            for start in range(0, self._count, chunk):
+                end = min(start + chunk, self._count)
+                keep = self._alive[start:end] & (self._labels[start:end] != label)
+                if not keep.any():
+                    continue
+                diff = self._exact[start:end][keep] - probe
+                best = min(best, float(np.einsum('ij,ij->i', diff, diff).min()))
+            return float(np.sqrt(best))
+
+    def match(self, encoding, tolerance, inclusive=True):
+        """
+        Find the closest known face among the probed cells
+
+        Args:
+            encoding: 128-d probe encoding
+            tolerance: maximum exact distance that still counts as a match
+            inclusive: distance == tolerance matches, False for a strict < check
+
+        Returns:
+            FaceMatch or None if nothing is within tolerance. margin is measured
+            against the other labels found in the probed cells.
+        """
+        probe = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            if len(self) == 0:
+                return None
+
+            centroid_distances = np.einsum('ij,ij->i', self.centroids - probe, self.centroids - probe)
+            nprobe = min(self.nprobe, len(self._lists))
+            cells = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+            candidates = np.concatenate([self._lists[cell] for cell in cells])
+            candidates = candidates[self._alive[candidates]]
+            if len(candidates) == 0:
+                return None
+
+            diff = self._coarse[candidates].astype(np.float32) - probe
+            coarse_distances = np.einsum('ij,ij->i', diff, diff)
+
+            k = min(self.rerank_k, len(candidates))
+            top = np.argpartition(coarse_distances, k - 1)[:k]
+            diff = self._exact[candidates[top]] - probe
+            exact_distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+            best = int(np.argmin(exact_distances))
+            best_distance = float(exact_distances[best])
+            if best_distance > tolerance or (not inclusive and best_distance == tolerance):
+                return None
+
+            best_name = self._labels[candidates[top[best]]]
+            others = coarse_distances[self._labels[candidates] != best_name]
+            margin = float(np.sqrt(others.min())) - best_distance if len(others) else float('inf')
+            return FaceMatch(best_name, best_distance, margin)
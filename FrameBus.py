@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+_CONVERSIONS = {
+    'rgb': cv2.COLOR_BGR2RGB,
+    'gray': cv2.COLOR_BGR2GRAY,
+}
+
+
+def _read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class Frame:
+    """
+    One captured frame shared by every consumer (preview, recognition,
+    anti-spoofing, registration).
+
+    image is a read-only view of the BGR capture, so no consumer can change
+    what the others see. Derived forms (rgb, gray, resized copies, pyramids)
+    are computed on first use and cached on the frame, so each conversion
+    happens at most once per frame however many consumers ask for it.
+    Consumers that need to draw on a frame must copy it first.
+    """
+
+    def __init__(self, seq, timestamp, image, stream=None):
+        """
+        Args:
+            seq: frame sequence number, increases by one per captured frame
+                 (None for frames that did not come from a bus)
+            timestamp: time.time() at capture
+            image: BGR image, or None for the empty frame before the first capture
+            stream: name of the FrameBus that published the frame; every stream
+                    numbers its frames from 1, so per-frame caches key by (stream, seq)
+        """
+        self.seq = seq
+        self.stream = stream
+        self.timestamp = timestamp
+        self.image = None if image is None else _read_only(image)
+        self._derived = {}
+        # consumers on different threads compute each derived form once;
+        # reentrant because some forms are built from others
+        self._lock = threading.RLock()
+
+    def _cached(self, key, compute):
+        with self._lock:
+            value = self._derived.get(key)
+            if value is None:
+                value = _read_only(compute())
+                self._derived[key] = value
+        return value
+
+    def has(self, color, size=None):
+        """True if the given form is already cached (free to use)"""
+        return (color, size) in self._derived
+
+    def convert(self, color):
+        """Full-size 'bgr', 'rgb' or 'gray' image (None for the empty frame)"""
+        if self.image is None or color == 'bgr':
+            return self.image
+        return self._cached((color, None), lambda: cv2.cvtColor(self.image, _CONVERSIONS[color]))
+
+    @property
+    def rgb(self):
+        return self.convert('rgb')
+
+    @property
+    def gray(self):
+        return self.convert('gray')
+
+    @property
+    def shape(self):
+        return None if self.image is None else self.image.shape
+
+    def resized(self, size=None, scale=None, color='bgr'):
+        """
+        Resized copy in the given color, cached per (color, size)
+
+        Args:
+            size: (width, height), or
+            scale: factor applied to both sides
+            color: 'bgr', 'rgb' or 'gray'
+        """
+        if self.image is None:
+            return None
+        height, width = self.image.shape[:2]
+        if size is None:
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale)))) if scale else (width, height)
+        size = tuple(size)
+        if size == (width, height):
+            return self.convert(color)
+
+        def compute():
+            interpolation = cv2.INTER_AREA if size[0] < width else cv2.INTER_LINEAR
+            if color == 'bgr' or self.has(color):
+                return cv2.resize(self.convert(color), size, interpolation=interpolation)
+            # shrink first, converting the smaller image touches fewer pixels
+            return cv2.cvtColor(self.resized(size, color='bgr'), _CONVERSIONS[color])
+        return self._cached((color, size), compute)
+
+    def pyramid(self, levels, color='gray'):
+        """
+        [full size, 1/2, 1/4, ...] images, levels entries long, each level cached
+
+        Args:
+            levels: number of images returned
+            color: 'bgr', 'rgb' or 'gray'
+        """
+        if self.image is None:
+            return []
+        images = [self.convert(color)]
+        for level in range(1, levels):
+            previous = images[-1]
+            images.append(self._cached((color, 'pyramid', level), lambda: cv2.pyrDown(previous)))
+        return images
+
+
+def as_frame(frame):
+    """Frame for a Frame or a bare BGR array, so helpers can take either"""
+    if isinstance(frame, Frame):
+        return frame
+    return Frame(None, None, frame)
+
+
+class FrameBus:
+    """
+    Publishes captured frames to subscribers and keeps the newest few in a
+    ring buffer (newest wins).
+    """
+
+    def __init__(self, name, buffer_size=4):
+        """
+        Args:
+            name: passed to subscribers with every frame
+            buffer_size: frames kept in the ring buffer
+        """
+        self.name = name
+        self.frames = deque(maxlen=buffer_size)
+        self.latest = Frame(0, None, None, name)
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """callback(name, Frame) runs on the publishing thread for every frame, keep it short"""
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, image, timestamp=None):
+        """
+        Wrap a freshly captured BGR image in the next Frame and hand it out.
+        The bus takes ownership of image: it must not be modified afterwards.
+
+        Returns:
+            Frame
+        """
+        frame = Frame(self.latest.seq + 1, timestamp or time.time(), image, self.name)
+        self.frames.append(frame)
+        self.latest = frame
+
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(self.name, frame)
+            except Exception as e:
+                print(f"Stream {self.name}: subscriber failed: {e}")
+        return frame
@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class FrameCache:
+    """
+    Small LRU of per-frame results keyed by stream and frame sequence number
+    (plus whatever else the caller puts in the key). Concurrent requests for a key that is
+    still being computed wait for that one computation instead of repeating it.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        Args:
+            key: hashable, e.g. (stream, frame_seq, use_multi_encodings)
+            compute: zero-argument callable producing the result on a miss
+
+        Returns:
+            the cached, shared in-flight, or freshly computed result
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
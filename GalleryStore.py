@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from FaceGallery import ENCODING_SIZE
+
+INDEX_FILE = 'gallery_index.json'
+KINDS = ('avg', 'multi')
+
+
+class GalleryStore:
+    """
+    Packed on-disk face gallery: one raw float32 (rows, 128) file per encoding
+    kind ('avg' and 'multi') plus gallery_index.json with the label of every row.
+
+    The matrices are memory-mapped read-only, so startup does not unpickle a
+    file per user and several processes share the same pages. Registration
+    appends rows; removal only blanks the row labels until compact() rewrites
+    the files. Data files carry a generation number and the index is swapped
+    in with os.replace, so a reader always sees a consistent index/data pair.
+    Build it from the legacy face_db/<user>/*.pkl layout with migrate_gallery.py.
+    Only one process should write to a store at a time.
+    """
+
+    def __init__(self, db_dir):
+        self.db_dir = db_dir
+        self.index_path = os.path.join(db_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    def _read_index(self):
+        with open(self.index_path, 'r') as f:
+            return json.load(f)
+
+    def _write_index(self, index):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def _data_path(self, kind, generation):
+        return os.path.join(self.db_dir, f'gallery_{kind}.{generation}.f32')
+
+    def _write_data(self, path, matrix, mode):
+        with open(path, mode) as f:
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self, kind):
+        """
+        Args:
+            kind: 'avg' or 'multi'
+
+        Returns:
+            (matrix, labels): float32 (N, 128) matrix and object array of N names.
+            The matrix is a read-only memmap of the data file when the store has
+            no removed rows, otherwise a compacted in-memory copy.
+        """
+        index = self._read_index()
+        labels = np.array(index[kind]['labels'], dtype=object)
+        if len(labels) == 0:
+            return np.empty((0, ENCODING_SIZE), dtype=np.float32), labels
+
+        matrix = np.memmap(self._data_path(kind, index['generation']), dtype=np.float32, mode='r',
+                           shape=(len(labels), ENCODING_SIZE))
+        live = labels != None  # noqa: E711 - elementwise comparison on an object array
+        if live.all():
+            return matrix, labels
+        return np.ascontiguousarray(matrix[live]), labels[live]
+
+    def users(self):
+        index = self._read_index()
+        return sorted(set(label for label in index['avg']['labels'] + index['multi']['labels'] if label))
+
+    def create(self, users):
+        """
+        Write a new store, replacing any existing one
+
+        Args:
+            users: iterable of (name, avg_encoding or None, multi_encodings or [])
+        """
+        rows = {kind: [] for kind in KINDS}
+        labels = {kind: [] for kind in KINDS}
+        for name, avg_encoding, multi_encodings in users:
+            if avg_encoding is not None:
+                rows['avg'].append(avg_encoding)
+                labels['avg'].append(name)
+            for encoding in multi_encodings or []:
+                rows['multi'].append(encoding)
+                labels['multi'].append(name)
+
+        with self._lock:
+            old_generation = self._read_index()['generation'] if self.exists() else None
+            generation = 0 if old_generation is None else old_generation + 1
+            for kind in KINDS:
+                matrix = np.asarray(rows[kind], dtype=np.float32).reshape(-1, ENCODING_SIZE)
+                self._write_data(self._data_path(kind, generation), matrix, 'wb')
+            self._write_index({
+                'version': 1,
+                'dim': ENCODING_SIZE,
+                'generation': generation,
+                'avg': {'labels': labels['avg']},
+                'multi': {'labels': labels['multi']},
+            })
+            if old_generation is not None:
+                self._remove_data(old_generation)
+
+    def _remove_data(self, generation):
+        # Processes that still have the old files mapped keep reading them fine
+        for kind in KINDS:
+            try:
+                os.remove(self._data_path(kind, generation))
+            except OSError:
+                pass
+
+    def add_user(self, name, avg_encoding, multi_encodings):
+        """Append a user's encodings (replacing any rows they already had)"""
+        with self._lock:
+            index = self._read_index()
+            self._blank(index, name)
+            new_rows = {'avg': [avg_encoding] if avg_encoding is not None else [],
+                        'multi': list(multi_encodings or [])}
+            for kind in KINDS:
+                if not new_rows[kind]:
+                    continue
+                matrix = np.asarray(new_rows[kind], dtype=np.float32).reshape(-1, ENCODING_SIZE)
+                path = self._data_path(kind, index['generation'])
+                # Drop bytes of an append that never made it into the index
+                with open(path, 'ab') as f:
+                    f.truncate(len(index[kind]['labels']) * ENCODING_SIZE * 4)
+                self._write_data(path, matrix, 'ab')
+                index[kind]['labels'].extend([name] * len(matrix))
+            self._write_index(index)
+
+    def remove_user(self, name, compact_ratio=0.25):
+        """Blank a user's rows, compacting once more than compact_ratio of the rows are dead"""
+        with self._lock:
+            index = self._read_index()
+            if not self._blank(index, name):
+                return
+            self._write_index(index)
+            total = sum(len(index[kind]['labels']) for kind in KINDS)
+            dead = sum(index[kind]['labels'].count(None) for kind in KINDS)
+        if total and dead / total > compact_ratio:
+            self.compact()
+
+    @staticmethod
+    def _blank(index, name):
+        removed = False
+        for kind in KINDS:
+            labels = index[kind]['labels']
+            for row, label in enumerate(labels):
+                if label == name:
+                    labels[row] = None
+                    removed = True
+        return removed
+
+    def compact(self):
+        """Rewrite the data files without removed rows"""
+        users = {}
+        for kind in KINDS:
+            matrix, labels = self.load(kind)
+            for encoding, name in zip(matrix, labels):
+                avg_encoding, multi_encodings = users.setdefault(name, [None, []])
+                if kind == 'avg':
+                    users[name][0] = np.array(encoding)
+                else:
+                    multi_encodings.append(np.array(encoding))
+        self.create((name, avg, multi) for name, (avg, multi) in users.items())
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from FaceGallery import FaceMatch
+
+
+class _HotIdentity:
+    def __init__(self, encodings):
+        self.encodings = np.asarray(encodings, dtype=np.float32)
+        # (probe encoding, distance from that probe to the closest *other* identity)
+        self.anchors = []
+        self.last_used = time.monotonic()
+
+
+class HotSetCache:
+    """
+    LRU/TTL cache of recently recognized identities, checked before the full
+    gallery search.
+
+    A cached identity is only returned when it is provably what an exact full
+    search would have returned. Every full-search match stores its probe as an
+    anchor together with the exact distance to the closest other identity: the
+    match's margin for a FaceGallery, a full exact scan for galleries whose
+    margin is approximate (IVFFaceIndex, exact_margin False). For those a cache
+    hit can therefore differ from the index's own approximate answer, but only
+    by being the true nearest identity.
+    For a new probe at distance delta from an anchor, every other identity is
+    at least (other_distance - delta) away by the triangle inequality. If the
+    cached identity's exact distance is within tolerance and beats that bound
+    by safety_margin, the gallery search is skipped.
+    """
+
+    def __init__(self, max_identities=64, ttl=3600.0, anchors_per_identity=4, safety_margin=0.02):
+        """
+        Args:
+            max_identities: identities kept, least recently matched are dropped first
+            ttl: seconds an identity stays cached without being matched again
+            anchors_per_identity: recent full-search probes remembered per identity
+            safety_margin: extra distance the bound must clear before trusting the cache
+        """
+        self.max_identities = max_identities
+        self.ttl = ttl
+        self.anchors_per_identity = anchors_per_identity
+        self.safety_margin = safety_margin
+
+        self._identities = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, gallery, encoding, tolerance, version):
+        """
+        Same result as gallery.match(encoding, tolerance), from the cache when safe
+
+        Args:
+            gallery: FaceGallery or IVFFaceIndex to fall back to
+            encoding: 128-d probe encoding
+            tolerance: maximum distance that still counts as a match
+            version: gallery version; any change (registration, reload) empties the cache
+
+        Returns:
+            FaceMatch or None
+        """
+        probe = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            if version != self._version:
+                self._identities.clear()
+                self._version = version
+            cached = self._lookup(probe, tolerance)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        match = gallery.match(probe, tolerance)
+        if match is not None:
+            self._remember(gallery, match, probe, version)
+        return match
+
+    def _lookup(self, probe, tolerance):
+        now = time.monotonic()
+        best = None
+        for name in list(self._identities):
+            identity = self._identities[name]
+            if now - identity.last_used > self.ttl:
+                del self._identities[name]
+                continue
+
+            distance = float(np.sqrt(np.min(np.sum((identity.encodings - probe) ** 2, axis=1))))
+            if distance > tolerance or not identity.anchors:
+                continue
+            # lower bound on the distance to any other identity, from the tightest anchor
+            bound = max(other - float(np.linalg.norm(anchor - probe)) for anchor, other in identity.anchors)
+            if distance + self.safety_margin < bound and (best is None or distance < best.distance):
+                best = FaceMatch(name, distance, bound - distance)
+
+        if best is not None:
+            self._identities[best.name].last_used = now
+            self._identities.move_to_end(best.name)
+        return best
+
+    def _remember(self, gallery, match, probe, version):
+        if getattr(gallery, 'exact_margin', True):
+            other_distance = match.distance + match.margin
+        else:
+            # an approximate margin is no lower bound, measure it exactly once per anchor
+            other_distance = gallery.nearest_other_distance(probe, match.name)
+        with self._lock:
+            if version != self._version:
+                return
+            identity = self._identities.get(match.name)
+            if identity is None:
+                identity = _HotIdentity(gallery.encodings_for(match.name))
+                self._identities[match.name] = identity
+            identity.anchors.append((probe, other_distance))
+            del identity.anchors[:-self.anchors_per_identity]
+            identity.last_used = time.monotonic()
+            self._identities.move_to_end(match.name)
+            while len(self._identities) > self.max_identities:
+                self._identities.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'identities': len(self._identities),
+            }
+
+
+class CachedGallery:
+    """Gallery view that answers match() through a HotSetCache, for util.recognize"""
+
+    def __init__(self, gallery, cache, version):
+        self.gallery = gallery
+        self.cache = cache
+        self.version = version
+
+    def __len__(self):
+        return len(self.gallery)
+
+    def match(self, encoding, tolerance):
+        return self.cache.match(self.gallery, encoding, tolerance, self.version)
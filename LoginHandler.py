@@ -12,9 +12,10 @@ class LoginHandler:
         if self.app.current_user:
             util.msg_box("Already Logged In", f"User '{self.app.current_user}' is already logged in.")
             return
-        frame = self.app.webcam.get_latest_frame()
+        frame = self.app.webcam.get_latest()
+        faces = self.app.face_detector.detect(frame)
 
-        status, name_or_id = self.recognition.recognize_face(frame)
+        status, name_or_id = self.recognition.recognize_face(frame, faces=faces, seq=frame.seq)
         if status == 'no_persons_found':
             util.msg_box("Error", "No face detected. Please try again.")
         elif status == 'multiple_faces_detected':
@@ -12,22 +12,19 @@ class LogoutHandler:
         if not self.app.current_user:
             util.msg_box("Error", "No user is currently logged in.")
             return
-        frame = self.app.webcam.get_latest_frame()
+        frame = self.app.webcam.get_latest()
+        faces = self.app.face_detector.detect(frame)
 
-        status, name_or_id = self.recognition.recognize_face(frame)
-        if status in ['no_persons_found', 'multiple_faces_detected', 'unknown_person']:
-            msg = {
-                'no_persons_found': "No face detected. Please try again.",
-                'multiple_faces_detected': "Multiple faces detected. Ensure only one person is in front of the camera.",
-                'unknown_person': "Face not recognized. Please try again."
-            }
-            util.msg_box("Error", msg.get(status, "Error on logout."))
+        # Only the logged-in user can log out, so a 1:1 check against them is enough
+        result = self.recognition.verify(faces, self.app.current_user)
+        if result.status == 'no_persons_found':
+            util.msg_box("Error", "No face detected. Please try again.")
             return
-        if status != self.app.current_user:
+        if not result.is_match:
             util.msg_box("Error", f"You are not the logged-in user ({self.app.current_user}). Logout denied.")
             return
-        name = status
-        emp_id = name_or_id
+        name = result.status
+        emp_id = self.recognition.user_directory.get_emp_id(name)
         util.msg_box("Goodbye!", f"Goodbye, {name} (ID: {emp_id}).")
         with open(self.log_path, 'a') as f:
             f.write(f'{name},{emp_id},{datetime.datetime.now()},out\n')
@@ -0,0 +1,90 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap "has anything changed?" test between periodic presence checks.
+
+    Each frame is reduced to a small blurred grayscale thumbnail (cached on
+    the Frame) and compared with the thumbnail of the frame that was last
+    fully checked. Comparing against that reference rather than the previous
+    tick means slow drift still adds up to a change. While the scene is static,
+    the verdict was confident and it is younger than max_staleness, the last
+    verdict can be carried forward instead of re-running detection,
+    recognition and anti-spoofing.
+    """
+
+    def __init__(self, size=(64, 48), pixel_threshold=18, changed_fraction=0.02, max_staleness=60.0):
+        """
+        Args:
+            size: (width, height) of the thumbnail that is compared
+            pixel_threshold: grey-level difference that counts a thumbnail pixel as changed
+            changed_fraction: share of changed pixels that counts as motion
+            max_staleness: seconds after which a full check is forced even in a static scene
+        """
+        self.size = tuple(size)
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_staleness = max_staleness
+
+        self.verdict = None
+        self.checks = 0
+        self.carried = 0
+        self._reference = None
+        self._confident = False
+        self._checked_at = 0.0
+
+    def _thumbnail(self, frame):
+        small = frame.resized(self.size, color='gray')
+        # blur away sensor noise and compression artefacts
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def reset(self):
+        """Forget the last verdict, e.g. when a different user logs in"""
+        self.verdict = None
+        self._reference = None
+        self._confident = False
+
+    def motion(self, frame):
+        """Share of thumbnail pixels that changed since the last full check (1.0 without one)"""
+        if self._reference is None:
+            return 1.0
+        diff = cv2.absdiff(self._thumbnail(frame), self._reference)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def can_carry(self, frame):
+        """
+        Returns:
+            (bool, str): whether the last verdict still holds for frame, and why / why not
+        """
+        if self.verdict is None:
+            return False, 'no previous check'
+        if not self._confident:
+            return False, 'previous verdict not confident'
+        age = time.monotonic() - self._checked_at
+        if age >= self.max_staleness:
+            return False, f'verdict is {age:.0f}s old'
+        motion = self.motion(frame)
+        if motion > self.changed_fraction:
+            return False, f'scene changed ({motion:.1%} of pixels)'
+        self.carried += 1
+        return True, f'scene static ({motion:.1%} of pixels changed), verdict {age:.0f}s old'
+
+    def record(self, frame, verdict, confident):
+        """Remember the result of a full check on frame"""
+        self.checks += 1
+        self.verdict = verdict
+        self._confident = confident
+        self._reference = self._thumbnail(frame)
+        self._checked_at = time.monotonic()
+
+    def stats(self):
+        total = self.checks + self.carried
+        return {
+            'checks': self.checks,
+            'carried': self.carried,
+            'carried_rate': self.carried / total if total else 0.0,
+        }
@@ -0,0 +1,164 @@
+import os
+import time
+
+from PIL import Image, ImageTk
+
+
+class PreviewRenderer:
+    """
+    Draws webcam frames into a Tk label as cheaply as possible.
+
+    The frame is shrunk to the label's on-screen size before the colour
+    conversion (cached on the Frame, so previews of the same size share it),
+    a single PhotoImage is reused via paste() instead of being
+    rebuilt per frame, frames whose seq has not changed are skipped, and the
+    redraw interval backs off when there is little CPU headroom: when the
+    machine has less than min_idle_cores idle, or when recognition keeps a
+    core busy (dlib runs mostly on one thread and shares the GIL with Tk)
+    and the preview takes more than render_share of the process's CPU.
+    """
+
+    def __init__(self, label, min_interval=33, max_interval=250, render_share=0.2, busy_load=0.75,
+                 min_idle_cores=0.5):
+        """
+        Args:
+            label: Tk label to draw into
+            min_interval: fastest redraw in ms (33 ms ~ 30 fps)
+            max_interval: slowest redraw in ms when the CPU is busy
+            render_share: fraction of wall time the preview may spend rendering, and
+                          of the process's CPU time while recognition is running
+            busy_load: process CPU load, as a share of one core, above which
+                       recognition is considered active
+            min_idle_cores: system-wide idle cores below which the preview slows down
+        """
+        self.label = label
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.render_share = render_share
+        self.busy_load = busy_load
+        self.min_idle_cores = min_idle_cores
+
+        self.interval = min_interval
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+        self._photo = None
+        self._photo_size = None
+        self._shown_seq = None
+        self._render_ms = 0.0
+        self._window_render_s = 0.0
+        self._cpu_count = os.cpu_count() or 1
+        self._last_wall = time.perf_counter()
+        self._last_cpu = time.process_time()
+        self._last_stat = self._read_proc_stat()
+        self.process_load = 0.0
+        self.idle_cores = None
+
+    def _target_size(self, frame):
+        """Largest size that fits the label and keeps the frame's aspect ratio"""
+        height, width = frame.shape[:2]
+        label_width, label_height = self.label.winfo_width(), self.label.winfo_height()
+        if label_width <= 1 or label_height <= 1:
+            # not laid out yet
+            return width, height
+        scale = min(label_width / width, label_height / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def render(self, frame):
+        """
+        Draw a Frame unless it is already on screen
+
+        Returns:
+            bool: True if the label was redrawn
+        """
+        if frame.image is None or frame.seq == self._shown_seq:
+            self.frames_skipped += 1
+            return False
+
+        start = time.perf_counter()
+        size = self._target_size(frame)
+        pil_img = Image.fromarray(frame.resized(size, color='rgb'))
+
+        if self._photo is None or self._photo_size != size:
+            self._photo = ImageTk.PhotoImage(image=pil_img)
+            self._photo_size = size
+            # Avoid garbage collection
+            self.label.imgtk = self._photo
+            self.label.configure(image=self._photo)
+        else:
+            self._photo.paste(pil_img)
+
+        self._shown_seq = frame.seq
+        self.frames_drawn += 1
+        elapsed = time.perf_counter() - start
+        self._window_render_s += elapsed
+        elapsed_ms = elapsed * 1000
+        self._render_ms = elapsed_ms if not self._render_ms else 0.8 * self._render_ms + 0.2 * elapsed_ms
+        return True
+
+    @staticmethod
+    def _read_proc_stat():
+        """(idle, total) CPU jiffies over all cores, None where /proc/stat is unavailable"""
+        try:
+            with open('/proc/stat') as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        # idle + iowait
+        return fields[3] + (fields[4] if len(fields) > 4 else 0), sum(fields)
+
+    def _system_idle_cores(self):
+        """Idle cores system-wide since the last call, None if it can't be measured"""
+        stat = self._read_proc_stat()
+        if stat is not None and self._last_stat is not None:
+            last, self._last_stat = self._last_stat, stat
+            total = stat[1] - last[1]
+            if total > 0:
+                return (stat[0] - last[0]) / total * self._cpu_count
+            return None
+        self._last_stat = stat
+        try:
+            # 1-minute load average, coarser but available on other Unixes
+            return max(0.0, self._cpu_count - os.getloadavg()[0])
+        except (AttributeError, OSError):
+            return None
+
+    def next_interval(self):
+        """Milliseconds until the next redraw, to pass to label.after()"""
+        now_wall, now_cpu = time.perf_counter(), time.process_time()
+        wall = now_wall - self._last_wall
+        if wall >= 0.5:
+            cpu = now_cpu - self._last_cpu
+            # measured against one core: a single busy recognition thread reads as ~1.0
+            self.process_load = cpu / wall
+            self.idle_cores = self._system_idle_cores()
+            render_of_process = self._window_render_s / cpu if cpu > 0 else 0.0
+            self._last_wall, self._last_cpu = now_wall, now_cpu
+            self._window_render_s = 0.0
+
+            short_of_cores = self.idle_cores is not None and self.idle_cores < self.min_idle_cores
+            # the process's load without the preview's own share is recognition
+            recognition_active = self.process_load * (1 - render_of_process) > self.busy_load
+            if short_of_cores or (recognition_active and render_of_process > self.render_share):
+                # recognition needs the CPU, back off
+                self.interval = self.interval * 1.5
+            else:
+                self.interval = self.interval * 0.8
+
+        # never spend more than render_share of the time drawing
+        floor = max(self.min_interval, self._render_ms / self.render_share)
+        self.interval = int(min(self.max_interval, max(floor, self.interval)))
+        return self.interval
+
+    def reset(self):
+        """Forget the shown frame, e.g. after the label was cleared"""
+        self._shown_seq = None
+
+    def stats(self):
+        return {
+            'fps': round(1000.0 / self.interval, 1),
+            'render_ms': round(self._render_ms, 2),
+            'process_load': round(self.process_load, 2),
+            'idle_cores': None if self.idle_cores is None else round(self.idle_cores, 2),
+            'drawn': self.frames_drawn,
+            'skipped': self.frames_skipped,
+        }
@@ -1,22 +1,207 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+
 import util
+from FaceGallery import FaceGallery
+from FaceIndex import IVFFaceIndex
+from FrameBus import Frame
+from FrameCache import FrameCache
+from GalleryStore import GalleryStore
+from HotSetCache import CachedGallery, HotSetCache
+from UserDirectory import UserDirectory
+
+
+# status: the user on a match, otherwise 'no_persons_found' or 'unknown_person'
+# distance: closest distance to the user's encodings (None if no face was encoded)
+# face: the DetectedFace that matched, when DetectedFaces were passed in
+Verification = namedtuple('Verification', ['status', 'is_match', 'distance', 'face'])
 
 
 class RecognitionHandler:
-    def __init__(self, db_dir, known_encodings=None, known_names=None, multi_encodings_dict=None):
+    def __init__(self, db_dir, known_encodings=None, known_names=None, multi_encodings_dict=None,
+                 user_directory=None, ann_threshold=20000, ann_nprobe=8, ann_rerank_k=32,
+                 gallery_store=None, profile='default', hot_set_size=64, hot_set_ttl=3600.0):
+        """
+        hot_set_size / hot_set_ttl: recently recognized identities checked before
+        the full gallery search (see HotSetCache)
+        profile: util.DETECTION_PROFILES name (or DetectionProfile) used when a
+        frame has to be detected and encoded here rather than by FaceDetector
+        gallery_store: optional GalleryStore; when it exists the galleries are built
+        directly on its memory-mapped matrices instead of from the encoding lists
+        known_encodings / known_names / multi_encodings_dict: when none of them is
+        given, they are loaded from db_dir (the gallery store, read once, or the
+        per-user files)
+
+        ann_threshold: galleries with more encodings than this are matched through
+        an approximate IVFFaceIndex (ann_nprobe / ann_rerank_k trade recall for
+        speed) instead of an exact brute-force FaceGallery scan
+        """
         self.db_dir = db_dir
+        self.ann_threshold = ann_threshold
+        self.ann_nprobe = ann_nprobe
+        self.ann_rerank_k = ann_rerank_k
+        self.gallery_store = gallery_store
+        self.profile = profile
+        # recognition results per (stream, frame seq, mode, gallery version)
+        self.frame_cache = FrameCache()
+        # keyed by use_multi_encodings, the two galleries use different tolerances
+        self.hot_sets = {False: HotSetCache(hot_set_size, hot_set_ttl),
+                         True: HotSetCache(hot_set_size, hot_set_ttl)}
+        self.gallery_version = 0
+        self.user_directory = user_directory or UserDirectory(os.path.join(db_dir, 'users.json'))
+        if known_encodings is None and known_names is None and multi_encodings_dict is None:
+            self.reload_known_faces()
+            return
         self.known_encodings = known_encodings or []
         self.known_names = known_names or []
         self.multi_encodings_dict = multi_encodings_dict or {}
+        self._build_galleries()
+
+    def _make_gallery(self, encodings, labels):
+        if len(labels) > self.ann_threshold:
+            return IVFFaceIndex(encodings, labels, nprobe=self.ann_nprobe, rerank_k=self.ann_rerank_k)
+        # Contiguous (N, 128) matrix, matched in one vectorized pass per probe
+        return FaceGallery(encodings, labels)
+
+    def _build_galleries(self, matrices=None):
+        """matrices: util.load_store_matrices result the lists were built from, used as is"""
+        self.gallery_version += 1
+        self.avg_encodings_by_name = dict(zip(self.known_names, self.known_encodings))
+        if matrices is not None:
+            avg_matrix, avg_labels, multi_matrix, multi_labels = matrices
+            self.gallery = self._make_gallery(avg_matrix, avg_labels)
+            self.multi_gallery = self._make_gallery(multi_matrix, multi_labels)
+            return
+
+        if len(self.known_encodings) != len(self.known_names):
+            print(f"Warning: Mismatch between encodings ({len(self.known_encodings)}) "
+                  f"and names ({len(self.known_names)})")
+            self.gallery = FaceGallery()
+        else:
+            self.gallery = self._make_gallery(self.known_encodings, self.known_names)
+        multi = FaceGallery.from_multi(self.multi_encodings_dict)
+        self.multi_gallery = self._make_gallery(multi.encodings, multi.labels)
+
+    def _grow(self, gallery):
+        # Switch a brute-force gallery over to the ANN index once it gets too large
+        if isinstance(gallery, FaceGallery) and len(gallery) > self.ann_threshold:
+            print(f"Gallery passed {self.ann_threshold} encodings, switching to the ANN index")
+            return self._make_gallery(gallery.encodings, gallery.labels)
+        return gallery
 
     def reload_known_faces(self):
-        self.known_encodings, self.known_names, self.multi_encodings_dict = util.load_known_faces(self.db_dir)
+        matrices = None
+        store = self.gallery_store or GalleryStore(self.db_dir)
+        if store.exists():
+            # one read of the store feeds both the galleries and the per-user lookups
+            matrices = util.load_store_matrices(store)
+        if matrices is not None:
+            self.known_encodings, self.known_names, self.multi_encodings_dict = util.faces_from_matrices(*matrices)
+        else:
+            self.known_encodings, self.known_names, self.multi_encodings_dict = util.load_legacy_faces(self.db_dir)
+        self._build_galleries(matrices)
+
+    def add_user(self, name, avg_encoding, multi_encodings):
+        """Add a newly registered user (or replace one) without re-reading the database"""
+        self.remove_user(name)
+        if avg_encoding is not None:
+            self.known_encodings.append(avg_encoding)
+            self.known_names.append(name)
+            self.avg_encodings_by_name[name] = avg_encoding
+            self.gallery.add(name, [avg_encoding])
+            self.gallery = self._grow(self.gallery)
+        if multi_encodings:
+            self.multi_encodings_dict[name] = list(multi_encodings)
+            self.multi_gallery.add(name, multi_encodings)
+            self.multi_gallery = self._grow(self.multi_gallery)
+        self.gallery_version += 1
 
-    def recognize_face(self, frame, use_multi_encodings=False):
+    def remove_user(self, name):
+        self.gallery_version += 1
+        if name in self.known_names:
+            index = self.known_names.index(name)
+            del self.known_names[index]
+            del self.known_encodings[index]
+        self.avg_encodings_by_name.pop(name, None)
+        self.multi_encodings_dict.pop(name, None)
+        self.gallery.remove(name)
+        self.multi_gallery.remove(name)
+
+    def _user_encodings(self, user, use_multi_encodings):
+        if use_multi_encodings:
+            return self.multi_encodings_dict.get(user)
+        avg_encoding = self.avg_encodings_by_name.get(user)
+        return None if avg_encoding is None else [avg_encoding]
+
+    def verify(self, frame_or_face, user, use_multi_encodings=False):
+        """
+        1:1 check of whether user is in front of the camera. Only that user's
+        encodings are compared, so the cost does not grow with the gallery.
+        Several faces in view are not an error: each is tried, most confident
+        first, until one matches.
+
+        Args:
+            frame_or_face: BGR frame or Frame, a DetectedFace, or a FaceDetector.detect result
+            user: name of the user to verify against
+            use_multi_encodings: compare against the per-pose encodings (timer)
+                                 instead of the average encoding (login/logout)
+
+        Returns:
+            Verification
+        """
+        tolerance = util.MULTI_TOLERANCE if use_multi_encodings else util.AVG_TOLERANCE
+        user_encodings = self._user_encodings(user, use_multi_encodings)
+
+        if isinstance(frame_or_face, (np.ndarray, Frame)):
+            candidates = [(None, encoding) for encoding in util.get_face_encodings(frame_or_face, self.profile)]
+        else:
+            faces = frame_or_face if isinstance(frame_or_face, (list, tuple)) else [frame_or_face]
+            # encodings are computed lazily, stop encoding as soon as one face matches
+            candidates = ((face, face.encoding) for face in faces)
+
+        best = Verification('no_persons_found', False, None, None)
+        for face, encoding in candidates:
+            if encoding is None:
+                continue
+            if not user_encodings:
+                return Verification('unknown_person', False, None, face)
+            distance = float(np.min(np.linalg.norm(np.asarray(user_encodings) - encoding, axis=1)))
+            if distance <= tolerance:
+                return Verification(user, True, distance, face)
+            if best.distance is None or distance < best.distance:
+                best = Verification('unknown_person', False, distance, face)
+        return best
+
+    def recognize_face(self, frame, use_multi_encodings=False, faces=None, seq=None):
         # Calls util.recognize; returns (status, emp_id or name)
+        # faces: optional FaceDetector.detect(frame) result, skips re-detection
+        # seq: frame sequence number, repeated calls for one frame of one stream are served from cache
+        if seq is not None:
+            stream = frame.stream if isinstance(frame, Frame) else None
+            key = (stream, seq, use_multi_encodings, self.gallery_version)
+            return self.frame_cache.get_or_compute(
+                key, lambda: self._recognize(frame, use_multi_encodings, faces))
+        return self._recognize(frame, use_multi_encodings, faces)
+
+    def _recognize(self, frame, use_multi_encodings, faces):
         return util.recognize(
             frame,
             self.db_dir,
             self.known_encodings,
             self.known_names,
-            use_multi_encodings=use_multi_encodings
-        )
\ No newline at end of file
+            use_multi_encodings=use_multi_encodings,
+            faces=faces,
+            gallery=CachedGallery(self.gallery, self.hot_sets[False], self.gallery_version),
+            multi_gallery=CachedGallery(self.multi_gallery, self.hot_sets[True], self.gallery_version),
+            user_directory=self.user_directory,
+            profile=self.profile
+        )
+
+    def cache_stats(self):
+        """Hot-set hit rates for the average (login) and multi-encoding (timer) searches"""
+        return {
+            'avg': self.hot_sets[False].stats(),
+            'multi': self.hot_sets[True].stats(),
+        }
@@ -5,11 +5,10 @@ import tkinter as tk
 
 import face_recognition
 import numpy as np
-from PIL import Image, ImageTk
 import cv2
 import os
-import json
 import util
+from PreviewRenderer import PreviewRenderer
 
 
 class RegistrationHandler:
@@ -42,75 +41,28 @@ class RegistrationHandler:
         self.btn_capture = None
         self.btn_accept = None  # Store reference to start button
 
-    def check_face_already_registered(self, test_frame, tolerance=0.32):
+    def check_face_already_registered(self, test_frame, tolerance=0.32, faces=None):
         """
         Check if the face in the test frame is already registered in the system
+        faces: optional FaceDetector.detect(test_frame) result, shares its detection and encoding
         Returns: (is_duplicate, existing_user_name, existing_emp_id) or (False, None, None)
         """
         try:
             # Extract face encoding from test frame
-            rgb_frame = cv2.cvtColor(test_frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame)
-
-            if len(face_locations) == 0:
+            status, test_encoding = util.get_single_face_encoding(test_frame, faces)
+            if status == 'no_persons_found':
                 return False, None, None, "No face detected"
-            elif len(face_locations) > 1:
+            elif status == 'multiple_faces_detected':
                 return False, None, None, "Multiple faces detected"
 
-            test_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-            if not test_encodings:
-                return False, None, None, "Could not extract face encoding"
-
-            test_encoding = test_encodings[0]
-
-            # Load users data to get name-empid mapping
-            users_file = os.path.join(self.app.db_dir, 'users.json')
-            users_data = {}
-            if os.path.exists(users_file):
-                with open(users_file, 'r') as f:
-                    try:
-                        users_data = json.load(f)
-                    except json.JSONDecodeError:
-                        users_data = {}
-
-            # Check against all registered users
-            for user_folder in os.listdir(self.app.db_dir):
-                user_path = os.path.join(self.app.db_dir, user_folder)
-                if not os.path.isdir(user_path) or user_folder.endswith('.json'):
-                    continue
-
-                # Try to load average encoding first
-                avg_encoding_path = os.path.join(user_path, 'avg_encoding.pkl')
-                if os.path.exists(avg_encoding_path):
-                    try:
-                        with open(avg_encoding_path, 'rb') as f:
-                            existing_encoding = pickle.load(f)
-
-                        # Compare faces
-                        face_distance = face_recognition.face_distance([existing_encoding], test_encoding)[0]
-
-                        if face_distance < tolerance:
-                            emp_id = users_data.get(user_folder, "Unknown")
-                            return True, user_folder, emp_id, None
-
-                    except Exception as e:
-                        print(f"Error loading encoding for {user_folder}: {e}")
-
-                # Also check against multi-encodings for more accuracy
-                multi_encoding_path = os.path.join(user_path, 'multi_encodings.pkl')
-                if os.path.exists(multi_encoding_path):
-                    try:
-                        with open(multi_encoding_path, 'rb') as f:
-                            multi_encodings = pickle.load(f)
-
-                        # Check against all multi-encodings
-                        matches = face_recognition.compare_faces(multi_encodings, test_encoding, tolerance=tolerance)
-                        if any(matches):
-                            emp_id = users_data.get(user_folder, "Unknown")
-                            return True, user_folder, emp_id, None
-
-                    except Exception as e:
-                        print(f"Error loading multi-encodings for {user_folder}: {e}")
+            # One vectorized pass over the in-memory galleries, average encodings first;
+            # the average check is strict (distance < tolerance), the multi one is
+            # inclusive like face_recognition.compare_faces
+            for gallery, inclusive in ((self.recognition.gallery, False), (self.recognition.multi_gallery, True)):
+                match = gallery.match(test_encoding, tolerance, inclusive)
+                if match is not None:
+                    emp_id = self.app.user_directory.get_emp_id(match.name, "Unknown")
+                    return True, match.name, emp_id, None
 
             return False, None, None, None
 
@@ -245,6 +197,7 @@ class RegistrationHandler:
         self.entry_name = entry_name
         self.entry_id = entry_id
         self.capture_label = capture_label
+        self.feed_renderer = PreviewRenderer(capture_label, min_interval=50)
         self.running = True
         self.registration_started = False
 
@@ -255,14 +208,9 @@ class RegistrationHandler:
         if not self.running:
             return
         # Get frame from existing webcam manager
-        frame = self.app.webcam.get_latest_frame()
-        if frame is not None:
-            img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(img_rgb)
-            imgtk = ImageTk.PhotoImage(image=pil_img)
-            self.capture_label.imgtk = imgtk
-            self.capture_label.configure(image=imgtk)
-        self.win.after(50, self._update_feed)
+        frame = self.app.webcam.get_latest()
+        self.feed_renderer.render(frame)
+        self.win.after(self.feed_renderer.next_interval(), self._update_feed)
 
     def close_window(self, win):
         self.running = False
@@ -276,20 +224,10 @@ class RegistrationHandler:
             util.msg_box("Error", "Name and Emp ID cannot be empty!")
             return
 
-        # Load or init users file
-        users_file = os.path.join(self.app.db_dir, 'users.json')
-        users_data = {}
-        if os.path.exists(users_file) and os.path.getsize(users_file) > 0:
-            with open(users_file, 'r') as f:
-                try:
-                    users_data = json.load(f)
-                except json.JSONDecodeError:
-                    users_data = {}
-
-        if name in users_data:
+        if self.app.user_directory.has_name(name):
             util.msg_box("Error", f"Username '{name}' is already taken!")
             return
-        if emp_id in users_data.values():
+        if self.app.user_directory.has_emp_id(emp_id):
             util.msg_box("Error", f"Emp ID '{emp_id}' is already registered!")
             return
 
@@ -300,8 +238,8 @@ class RegistrationHandler:
         )
         self.win.update()  # Force UI update
 
-        current_frame = self.app.webcam.get_latest_frame()
-        if current_frame is None:
+        current_frame = self.app.webcam.get_latest()
+        if current_frame.image is None:
             util.msg_box("Error", "Unable to capture frame for verification. Please try again.")
             self.pose_indicator.config(
                 text="🎯 Ready to Start",
@@ -309,7 +247,8 @@ class RegistrationHandler:
             )
             return
 
-        is_duplicate, existing_name, existing_emp_id, error_msg = self.check_face_already_registered(current_frame)
+        is_duplicate, existing_name, existing_emp_id, error_msg = self.check_face_already_registered(
+            current_frame, faces=self.app.face_detector.detect(current_frame))
 
         if error_msg:
             util.msg_box("Error", f"Face verification failed: {error_msg}")
@@ -439,18 +378,10 @@ class RegistrationHandler:
         self.update_pose_indicator(0, "saving")
 
         # Save user to users.json
-        users_file = os.path.join(self.app.db_dir, 'users.json')
-        try:
-            with open(users_file, 'r') as f:
-                users_data = json.load(f)
-        except:
-            users_data = {}
-
-        users_data[self.current_name] = self.current_emp_id
-        with open(users_file, 'w') as f:
-            json.dump(users_data, f, indent=4)
+        self.app.user_directory.add(self.current_name, self.current_emp_id)
 
         # Calculate and save average encoding
+        avg_encoding = None
         if self.captured_encodings:
             avg_encoding = np.mean(self.captured_encodings, axis=0)
             with open(os.path.join(self.current_user_dir, 'avg_encoding.pkl'), 'wb') as f:
@@ -460,8 +391,12 @@ class RegistrationHandler:
         with open(os.path.join(self.current_user_dir, 'multi_encodings.pkl'), 'wb') as f:
             pickle.dump(self.captured_encodings, f)
 
-        # Reload in recognition handler
-        self.recognition.reload_known_faces()
+        # Append to the packed gallery file once face_db has been migrated to it
+        if self.app.gallery_store.exists():
+            self.app.gallery_store.add_user(self.current_name, avg_encoding, self.captured_encodings)
+
+        # Add to the in-memory galleries, no need to re-read every user from disk
+        self.recognition.add_user(self.current_name, avg_encoding, self.captured_encodings)
 
         # Show completion
         self.update_pose_indicator(0, "complete")
@@ -1,14 +1,21 @@
 import util
+from MotionGate import MotionGate
 from timing_counters import update_attendance, get_user_timer_data
-import json
 import threading
 import time
 import tkinter as tk
 
 
 class TimerManager:
-    def __init__(self, app, recognition_handler, users_file_path):
+    def __init__(self, app, recognition_handler, users_file_path, stream=None, motion_gate=True, max_staleness=60.0,
+                 confident_margin=0.1, confident_liveness=0.6):
+        # stream: CaptureStream to monitor, defaults to the app's webcam preview
+        # motion_gate: skip the full check while the scene is static and the last verdict was confident,
+        #              at least every max_staleness seconds a full check still runs
+        # confident_margin / confident_liveness: a presence verdict is confident when the match distance is
+        #              this far inside util.MULTI_TOLERANCE and the anti-spoof score is at least this high
         self.app = app
+        self.stream = stream
         self.recognition = recognition_handler
         self.users_file_path = users_file_path
         self.job_id = None
@@ -17,8 +24,13 @@ class TimerManager:
         self.spoofing_alert_counter = 0
         self.consecutive_spoofing_count = 0
         self.debug_mode = True  # Enable debug logging
+        self.motion_gate = MotionGate(max_staleness=max_staleness) if motion_gate else None
+        self.confident_margin = confident_margin
+        self.confident_liveness = confident_liveness
 
     def start(self):
+        if self.motion_gate:
+            self.motion_gate.reset()
         self.alert_threshold = 0
         self.spoofing_alert_counter = 0
         self.consecutive_spoofing_count = 0
@@ -40,54 +52,27 @@ class TimerManager:
 
         def recognition_task():
             try:
-                frame = self.app.webcam.get_latest_frame()
-                if frame is None:
+                if self.stream is not None:
+                    frame = self.stream.latest
+                else:
+                    frame = self.app.webcam.get_latest()
+                if frame.image is None:
                     print("Warning: No frame available from webcam")
                     self.job_id = self.app.main_window.after(self.interval_ms, self._perform_update)
                     return
 
-                # First check for face recognition
-                status, emp_id_detected = self.recognition.recognize_face(frame, use_multi_encodings=True)
-                face_recognized = (status == self.app.current_user)
-
-                if self.debug_mode:
-                    print(
-                        f"Face recognition status: {status}, Expected: {self.app.current_user}, Match: {face_recognized}")
-
-                # Initialize presence status
-                is_present = False
-                spoof_detected = False
-
-                # If face is recognized, check for anti-spoofing
-                if face_recognized:
-                    if self.debug_mode:
-                        print("Face recognized - checking for spoofing...")
-
-                    # Check if face is authentic (not spoofed)
-                    spoof_result = self.app.anti_spoof_handler.check_frame_authenticity(frame)
-
+                carry, reason = self.motion_gate.can_carry(frame) if self.motion_gate else (False, None)
+                if carry:
+                    # Nothing moved since a confident check - nearly free tick
+                    face_recognized, is_present, spoof_detected = self.motion_gate.verdict
                     if self.debug_mode:
-                        print(f"Anti-spoof result: {spoof_result}")
-
-                    if spoof_result['is_authentic']:
-                        is_present = True
-                        self.consecutive_spoofing_count = 0  # Reset spoofing counter
-                        if self.debug_mode:
-                            print("✓ Face is authentic - marking as present")
-                    else:
-                        # Face recognized but spoofed - mark as absent
-                        spoof_detected = True
-                        self.consecutive_spoofing_count += 1
-                        print(f"🚨 SPOOFING DETECTED for {self.app.current_user}: {spoof_result['status']} "
-                              f"(confidence: {spoof_result['confidence']:.2f}) - Count: {self.consecutive_spoofing_count}")
-
-                        # Log spoofing attempt
-                        self._log_spoofing_attempt(spoof_result)
-
+                        print(f"Motion gate: {reason} - keeping last verdict")
                 else:
-                    # Face not recognized at all
-                    if self.debug_mode:
-                        print("Face not recognized - marking as absent")
+                    if self.debug_mode and reason:
+                        print(f"Motion gate: {reason} - full check")
+                    face_recognized, is_present, spoof_detected, confident = self._check_presence(frame)
+                    if self.motion_gate:
+                        self.motion_gate.record(frame, (face_recognized, is_present, spoof_detected), confident)
 
                 # Update attendance based on presence status
                 update_attendance(self.app.current_user, is_present)
@@ -96,13 +81,7 @@ class TimerManager:
                 absent = timers['absentCounter']
                 missed = timers['absentTimeCounter']
 
-                # Read emp_id
-                try:
-                    with open(self.users_file_path, 'r') as f:
-                        users_data = json.load(f)
-                        emp_id = users_data.get(self.app.current_user, "N/A")
-                except:
-                    emp_id = "N/A"
+                emp_id = self.app.user_directory.get_emp_id(self.app.current_user)
 
                 # Update UI
                 def update_ui():
@@ -175,6 +154,70 @@ class TimerManager:
 
         threading.Thread(target=recognition_task, daemon=True).start()
 
+    def _check_presence(self, frame):
+        """
+        Full presence check: detection, 1:1 verification and anti-spoofing
+
+        Returns:
+            (face_recognized, is_present, spoof_detected, confident): confident when the
+            verdict is clear enough for the motion gate to carry it forward
+        """
+        # Detect once, then share the faces with recognition and anti-spoofing
+        faces = self.app.face_detector.detect(frame)
+
+        # First check the logged-in user is the one in view (1:1, independent of gallery size)
+        verification = self.recognition.verify(faces, self.app.current_user, use_multi_encodings=True)
+        face_recognized = verification.is_match
+
+        if self.debug_mode:
+            print(
+                f"Face verification status: {verification.status}, Expected: {self.app.current_user}, "
+                f"Distance: {verification.distance}, Match: {face_recognized}")
+
+        # Initialize presence status
+        is_present = False
+        spoof_detected = False
+
+        # If face is recognized, check for anti-spoofing
+        if face_recognized:
+            if self.debug_mode:
+                print("Face recognized - checking for spoofing...")
+
+            # Check if face is authentic (not spoofed)
+            spoof_result = self.app.anti_spoof_handler.check_frame_authenticity(
+                frame.image, face=verification.face)
+
+            if self.debug_mode:
+                print(f"Anti-spoof result: {spoof_result}")
+
+            if spoof_result['is_authentic']:
+                is_present = True
+                self.consecutive_spoofing_count = 0  # Reset spoofing counter
+                if self.debug_mode:
+                    print("✓ Face is authentic - marking as present")
+            else:
+                # Face recognized but spoofed - mark as absent
+                spoof_detected = True
+                self.consecutive_spoofing_count += 1
+                print(f"🚨 SPOOFING DETECTED for {self.app.current_user}: {spoof_result['status']} "
+                      f"(confidence: {spoof_result['confidence']:.2f}) - Count: {self.consecutive_spoofing_count}")
+
+                # Log spoofing attempt
+                self._log_spoofing_attempt(spoof_result)
+
+        else:
+            # Face not recognized at all
+            if self.debug_mode:
+                print("Face not recognized - marking as absent")
+
+        if is_present:
+            confident = (verification.distance <= util.MULTI_TOLERANCE - self.confident_margin
+                         and spoof_result['confidence'] >= self.confident_liveness)
+        else:
+            # an empty view stays empty until something moves; unknown faces and spoofs are always re-checked
+            confident = verification.status == 'no_persons_found'
+        return face_recognized, is_present, spoof_detected, confident
+
     def _log_spoofing_attempt(self, spoof_result):
         """Log spoofing attempts to a file"""
         try:
@@ -197,5 +240,6 @@ class TimerManager:
         return {
             'spoofing_alert_counter': self.spoofing_alert_counter,
             'consecutive_spoofing_count': self.consecutive_spoofing_count,
-            'current_user': self.app.current_user
+            'current_user': self.app.current_user,
+            'motion_gate': self.motion_gate.stats() if self.motion_gate else None
         }
\ No newline at end of file
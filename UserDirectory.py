@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+
+
+class UserDirectory:
+    """
+    The name <-> emp_id roster from users.json, loaded once and kept in memory.
+
+    Lookups only stat the file; it is parsed again only when its mtime/size
+    changed (e.g. another process edited it). version increases on every reload
+    or write, so callers can cheaply tell whether their own caches are stale.
+    """
+
+    def __init__(self, users_file):
+        self.users_file = users_file
+        self.version = 0
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._by_name = {}
+        self._by_emp_id = {}
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.users_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _set(self, users_data, stamp):
+        self._by_name = dict(users_data)
+        self._by_emp_id = {emp_id: name for name, emp_id in self._by_name.items()}
+        self._stamp = stamp
+        self.version += 1
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return
+            users_data = {}
+            if stamp is not None and stamp[1] > 0:
+                try:
+                    with open(self.users_file, 'r') as f:
+                        users_data = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Error reading {self.users_file}: {e}")
+                    return
+            self._set(users_data, stamp)
+
+    def get_emp_id(self, name, default="N/A"):
+        self._refresh()
+        return self._by_name.get(name, default)
+
+    def get_name(self, emp_id, default=None):
+        self._refresh()
+        return self._by_emp_id.get(emp_id, default)
+
+    def has_name(self, name):
+        self._refresh()
+        return name in self._by_name
+
+    def has_emp_id(self, emp_id):
+        self._refresh()
+        return emp_id in self._by_emp_id
+
+    def as_dict(self):
+        self._refresh()
+        return dict(self._by_name)
+
+    def _write(self, users_data):
+        # Write a temp file and swap it in, readers never see a half-written roster
+        tmp_path = self.users_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(users_data, f, indent=4)
+        os.replace(tmp_path, self.users_file)
+        self._set(users_data, self._file_stamp())
+
+    def add(self, name, emp_id):
+        with self._lock:
+            self._refresh()
+            users_data = dict(self._by_name)
+            users_data[name] = emp_id
+            self._write(users_data)
+
+    def remove(self, name):
+        with self._lock:
+            self._refresh()
+            if name not in self._by_name:
+                return
+            users_data = dict(self._by_name)
+            del users_data[name]
+            self._write(users_data)
@@ -1,43 +1,74 @@
-import cv2
-from PIL import Image, ImageTk
+from CaptureManager import CaptureStream, Frame  # noqa: F401 - Frame re-exported for callers
+from PreviewRenderer import PreviewRenderer
 
 
 class WebcamManager:
-    def __init__(self, camera_index=0, update_interval=20):
+    def __init__(self, camera_index=0, update_interval=33, buffer_size=4, stream=None):
+        """
+        Frames are read on a background capture thread into a small ring buffer
+        (newest wins), so a slow or stalled camera never blocks Tk. The preview
+        redraws at most every update_interval ms through a PreviewRenderer,
+        which slows down when recognition needs the CPU.
+
+        stream: a CaptureStream owned by a CaptureManager to preview instead of
+                opening camera_index; it is left running on stop()
+        """
         self.camera_index = camera_index
         self.update_interval = update_interval
-        self.cap = None
-        self.frame = None
+        self.owns_stream = stream is None
+        self.stream = stream or CaptureStream('webcam', camera_index, buffer_size)
         self.running = False
         self.label = None
+        self.renderer = None
+
+    @property
+    def frame(self):
+        return self.stream.latest.image
+
+    @property
+    def frames(self):
+        return self.stream.frames
 
     def start(self, label):
         self.label = label
-        self.cap = cv2.VideoCapture(self.camera_index)
+        self.renderer = PreviewRenderer(label, min_interval=self.update_interval)
         self.running = True
+        self.stream.start()
         self._update_frame()
 
     def stop(self):
         self.running = False
-        if self.cap:
-            self.cap.release()
-            self.cap = None
+        if self.owns_stream:
+            self.stream.stop()
 
     def _update_frame(self):
-        if not self.running or not self.cap:
+        if not self.running:
             return
-        ret, frame = self.cap.read()
-        if ret:
-            self.frame = frame
-            # Convert and display
-            img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(img_rgb)
-            imgtk = ImageTk.PhotoImage(image=pil_img)
-            # Avoid garbage collection
-            self.label.imgtk = imgtk
-            self.label.configure(image=imgtk)
+        frame = self.stream.latest
+        self.renderer.render(frame)
         # Schedule next update
-        self.label.after(self.update_interval, self._update_frame)
+        self.label.after(self.renderer.next_interval(), self._update_frame)
 
     def get_latest_frame(self):
-        return self.frame
\ No newline at end of file
+        """Newest captured image (None before the first one); never waits on the camera"""
+        return self.stream.latest.image
+
+    def get_latest_frame_with_seq(self):
+        """
+        Returns:
+            (seq, frame): frame sequence number, usable as a cache key for
+            per-frame results, and the frame itself (None before the first one)
+        """
+        frame = self.stream.latest
+        return frame.seq, frame.image
+
+    def get_latest(self):
+        """Newest Frame(seq, timestamp, image)"""
+        return self.stream.latest
+
+    def get_recent_frames(self):
+        """Frames still in the ring buffer, oldest first"""
+        return list(self.stream.frames)
+
+    def health(self):
+        return self.stream.health()
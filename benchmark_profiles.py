@@ -0,0 +1,142 @@
+"""
+Latency and accuracy of the face detection/encoding profiles in util.DETECTION_PROFILES,
+measured through FaceDetector (RetinaFace) and DetectedFace.encoding as the app runs them.
+
+    python benchmark_profiles.py --data_dir face_db --width 1920
+
+data_dir holds one folder of images per person (the face_db layout written by
+registration works as-is). Every image is run through every profile and for
+each profile the script reports:
+  - detection and encoding latency (mean / p50 / p90 per image)
+  - how many images had exactly one face found
+  - leave-one-out identification accuracy: each image's encoding is matched
+    against all other images and must hit the same person within tolerance
+  - false accepts: nearest other image belongs to a different person but is
+    still within tolerance
+  - mean distance of each encoding to the 'default' profile's encoding of the
+    same image (how far a profile drifts from what registration stored)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import util
+from FaceDetector import FaceDetector
+from FrameBus import Frame
+from src.detection import Detection
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_dataset(data_dir, width):
+    images, labels, paths = [], [], []
+    for person in sorted(os.listdir(data_dir)):
+        person_dir = os.path.join(data_dir, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for name in sorted(os.listdir(person_dir)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            image = cv2.imread(os.path.join(person_dir, name))
+            if image is None:
+                continue
+            if width and image.shape[1] != width:
+                # emulate the resolution of the real feed
+                scale = width / image.shape[1]
+                image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+            images.append(image)
+            labels.append(person)
+            paths.append(os.path.join(person_dir, name))
+    return images, labels, paths
+
+
+def run_profile(detector, images):
+    """Returns (encodings with None where no single face was found, detect ms, encode ms)"""
+    encodings, detect_ms, encode_ms = [], [], []
+    for image in images:
+        start = time.perf_counter()
+        # a fresh Frame per image, so the RGB conversion is charged to detection as in the app
+        faces = detector.detect(Frame(None, None, image))
+        detect_ms.append((time.perf_counter() - start) * 1000)
+        if len(faces) != 1:
+            encodings.append(None)
+            continue
+        start = time.perf_counter()
+        encoding = faces[0].encoding
+        encode_ms.append((time.perf_counter() - start) * 1000)
+        encodings.append(encoding)
+    return encodings, np.array(detect_ms), np.array(encode_ms)
+
+
+def identification(encodings, labels, tolerance):
+    """Returns (correct, false accepts, evaluated) for leave-one-out nearest-neighbour matching"""
+    found = [i for i, encoding in enumerate(encodings) if encoding is not None]
+    if len(found) < 2:
+        return 0, 0, 0
+    matrix = np.array([encodings[i] for i in found])
+    names = np.array([labels[i] for i in found], dtype=object)
+    distances = np.linalg.norm(matrix[:, None, :] - matrix[None, :, :], axis=2)
+    np.fill_diagonal(distances, np.inf)
+    nearest = np.argmin(distances, axis=1)
+    within = distances[np.arange(len(found)), nearest] <= tolerance
+    same = names[nearest] == names
+    return int(np.sum(within & same)), int(np.sum(within & ~same)), len(found)
+
+
+def percentiles(values):
+    if len(values) == 0:
+        return "     -        -        -"
+    p50, p90 = np.percentile(values, [50, 90])
+    return f"{values.mean():6.1f} {p50:8.1f} {p90:8.1f}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark face detection/encoding profiles")
+    parser.add_argument("--data_dir", type=str, default="face_db", help="one folder of images per person")
+    parser.add_argument("--profiles", nargs='+', default=list(util.DETECTION_PROFILES),
+                        choices=list(util.DETECTION_PROFILES))
+    parser.add_argument("--width", type=int, default=1920,
+                        help="resize images to this width first (0 keeps them as they are)")
+    parser.add_argument("--tolerance", type=float, default=util.MULTI_TOLERANCE,
+                        help="match tolerance for the accuracy check")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    images, labels, paths = load_dataset(args.data_dir, args.width)
+    if not images:
+        print(f"No images found in {args.data_dir}")
+        sys.exit(1)
+    print(f"{len(images)} images of {len(set(labels))} people, "
+          f"{images[0].shape[1]}x{images[0].shape[0]}\n")
+
+    # one RetinaFace net for every profile, as App shares the anti-spoof one
+    detection = Detection()
+    detectors = {name: FaceDetector(detection, profile=name) for name in util.DETECTION_PROFILES}
+    # warm up the nets so the first profile is not charged for loading them
+    for face in detectors['default'].detect(Frame(None, None, images[0])):
+        face.encoding
+
+    results = {}
+    for name in args.profiles:
+        results[name] = run_profile(detectors[name], images)
+    reference = results.get('default') or run_profile(detectors['default'], images)
+
+    print(f"{'profile':<10} {'detect ms (mean/p50/p90)':>26} {'encode ms (mean/p50/p90)':>26} "
+          f"{'found':>7} {'accuracy':>9} {'false acc':>9} {'drift':>7}")
+    for name in args.profiles:
+        encodings, detect_ms, encode_ms = results[name]
+        correct, false_accepts, evaluated = identification(encodings, labels, args.tolerance)
+        drift = [np.linalg.norm(encoding - ref) for encoding, ref in zip(encodings, reference[0])
+                 if encoding is not None and ref is not None]
+        found = sum(encoding is not None for encoding in encodings)
+        accuracy = f"{correct / evaluated:9.1%}" if evaluated else f"{'-':>9}"
+        print(f"{name:<10} {percentiles(detect_ms):>26} {percentiles(encode_ms):>26} "
+              f"{found:>3}/{len(images):<3} {accuracy} {false_accepts:>9} "
+              f"{np.mean(drift) if drift else float('nan'):7.3f}")
@@ -0,0 +1,87 @@
+"""
+Export the anti-spoof .pth models to ONNX for the torch-free cv2.dnn backend
+and check the exported graphs against the PyTorch outputs.
+
+    python export_onnx.py --model_dir ./resources/anti_spoof_models
+"""
+
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from src.anti_spoof_predict import build_model
+from src.anti_spoof_predict_dnn import onnx_path_for, softmax
+from src.utility import parse_model_name
+
+
+def export_model(model_path, opset):
+    model, _ = build_model(model_path, torch.device("cpu"))
+    # view(size(0), -1) exports as a Shape/Reshape chain that cv2.dnn pins to
+    # batch 1; nn.Flatten maps to the ONNX Flatten op and keeps batch dynamic
+    model.conv_6_flatten = torch.nn.Flatten()
+    h_input, w_input, _, _ = parse_model_name(os.path.basename(model_path))
+    dummy = torch.zeros(1, 3, h_input, w_input)
+    onnx_path = onnx_path_for(model_path)
+    export_kwargs = dict(
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset,
+    )
+    try:
+        torch.onnx.export(model, dummy, onnx_path, dynamo=False, **export_kwargs)
+    except TypeError:
+        # older torch without the dynamo switch
+        torch.onnx.export(model, dummy, onnx_path, **export_kwargs)
+    return model, onnx_path, (h_input, w_input)
+
+
+def validate_model(model, onnx_path, input_size, batch_sizes, atol):
+    """Compare softmax outputs of torch and cv2.dnn on random 0-255 inputs"""
+    net = cv2.dnn.readNetFromONNX(onnx_path)
+    rng = np.random.default_rng(0)
+    worst = 0.0
+    for batch_size in batch_sizes:
+        batch = rng.uniform(0, 255, size=(batch_size, 3) + tuple(input_size)).astype(np.float32)
+        with torch.no_grad():
+            expected = F.softmax(model(torch.from_numpy(batch)), dim=1).numpy()
+        net.setInput(batch)
+        actual = softmax(net.forward().reshape(batch_size, -1))
+        if np.argmax(expected, axis=1).tolist() != np.argmax(actual, axis=1).tolist():
+            return False, float(np.abs(expected - actual).max())
+        worst = max(worst, float(np.abs(expected - actual).max()))
+    return worst <= atol, worst
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export anti-spoof models to ONNX")
+    parser.add_argument("--model_dir", type=str, default="./resources/anti_spoof_models",
+                        help="directory containing the .pth models")
+    parser.add_argument("--opset", type=int, default=11, help="ONNX opset version")
+    parser.add_argument("--atol", type=float, default=1e-4,
+                        help="max allowed difference between torch and cv2.dnn probabilities")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    model_files = sorted(f for f in os.listdir(args.model_dir) if f.endswith('.pth'))
+    if not model_files:
+        print(f"No .pth model files found in {args.model_dir}")
+        sys.exit(1)
+
+    failed = False
+    for model_name in model_files:
+        model_path = os.path.join(args.model_dir, model_name)
+        model, onnx_path, input_size = export_model(model_path, args.opset)
+        ok, max_diff = validate_model(model, onnx_path, input_size, (1, 4), args.atol)
+        print(f"{'✓' if ok else '✗'} {model_name} -> {os.path.basename(onnx_path)} "
+              f"(max prob diff {max_diff:.2e})")
+        failed = failed or not ok
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,106 @@
+"""
+Audit the face gallery for identities that look like the same person registered
+twice (under two names / emp_ids).
+
+    python find_duplicates.py --db_dir face_db --threshold 0.32 --output duplicates.csv
+
+Distances are computed over all pairs in square blocks of --block_size rows,
+so memory stays at block_size^2 floats however large the roster is.
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+import util
+from FaceGallery import FaceGallery
+from UserDirectory import UserDirectory
+
+
+def find_near_duplicates(encodings, labels, threshold, block_size=4096):
+    """
+    Args:
+        encodings: (N, 128) encodings
+        labels: N names; rows sharing a name are never reported against each other
+        threshold: maximum euclidean distance for a suspected duplicate
+        block_size: rows per block, peak memory is about block_size^2 * 4 bytes
+
+    Returns:
+        dict: {(name_a, name_b): closest distance between any of their rows}
+    """
+    matrix = np.ascontiguousarray(encodings, dtype=np.float32)
+    labels = np.asarray(labels, dtype=object)
+    norms = np.einsum('ij,ij->i', matrix, matrix)
+    limit = threshold * threshold
+    pairs = {}
+
+    for i in range(0, len(matrix), block_size):
+        rows = matrix[i:i + block_size]
+        for j in range(i, len(matrix), block_size):
+            cols = matrix[j:j + block_size]
+            # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, one matrix product per block
+            squared = norms[i:i + block_size, None] + norms[None, j:j + block_size] - 2 * rows @ cols.T
+            if i == j:
+                # each unordered pair once, and never a row against itself
+                squared[np.tril_indices(len(rows))] = np.inf
+            hit_rows, hit_cols = np.nonzero(squared <= limit)
+            for r, c in zip(hit_rows, hit_cols):
+                name_a, name_b = labels[i + r], labels[j + c]
+                if name_a == name_b:
+                    continue
+                key = (name_a, name_b) if name_a < name_b else (name_b, name_a)
+                distance = float(np.sqrt(max(squared[r, c], 0.0)))
+                if distance < pairs.get(key, np.inf):
+                    pairs[key] = distance
+    return pairs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find suspected duplicate registrations")
+    parser.add_argument("--db_dir", type=str, default="face_db", help="face database directory")
+    parser.add_argument("--kind", choices=['avg', 'multi'], default='multi',
+                        help="compare average encodings (one per user) or every pose encoding")
+    parser.add_argument("--threshold", type=float, default=0.32,
+                        help="distance below which two identities are reported (enrollment check uses 0.32)")
+    parser.add_argument("--block_size", type=int, default=4096, help="rows per distance block")
+    parser.add_argument("--output", type=str, default=None, help="optional CSV report")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.isdir(args.db_dir):
+        print(f"Database directory {args.db_dir} does not exist")
+        sys.exit(1)
+
+    known_encodings, known_names, multi_encodings_dict = util.load_known_faces(args.db_dir)
+    if args.kind == 'avg':
+        gallery = FaceGallery(known_encodings, known_names)
+    else:
+        gallery = FaceGallery.from_multi(multi_encodings_dict)
+
+    start = time.perf_counter()
+    pairs = find_near_duplicates(gallery.encodings, gallery.labels, args.threshold, args.block_size)
+    elapsed = time.perf_counter() - start
+
+    users = UserDirectory(os.path.join(args.db_dir, 'users.json'))
+    report = sorted(pairs.items(), key=lambda item: item[1])
+    print(f"\nCompared {len(gallery)} {args.kind} encodings of {len(set(gallery.labels))} users "
+          f"in {elapsed:.1f}s")
+    print(f"Suspected duplicates (distance <= {args.threshold}): {len(report)}")
+    for (name_a, name_b), distance in report:
+        print(f"  {distance:.3f}  {name_a} ({users.get_emp_id(name_a)})  <->  "
+              f"{name_b} ({users.get_emp_id(name_b)})")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['distance', 'name_a', 'emp_id_a', 'name_b', 'emp_id_b'])
+            for (name_a, name_b), distance in report:
+                writer.writerow([f"{distance:.4f}", name_a, users.get_emp_id(name_a),
+                                 name_b, users.get_emp_id(name_b)])
+        print(f"Report written to {args.output}")
@@ -1,6 +1,33 @@
+import argparse
+
+import util
 from App import App
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Face Recognition Attendance System")
+    parser.add_argument("--source", action="append", default=None,
+                        help="camera index, RTSP URL or video file; repeat for several streams "
+                             "(default: webcam 0)")
+    parser.add_argument("--preview", type=str, default=None,
+                        help="stream shown in the main window, e.g. cam1 (default: the first)")
+    parser.add_argument("--monitor", type=str, default=None,
+                        help="stream the presence timer watches, e.g. cam1 (default: the preview)")
+    parser.add_argument("--profile", choices=sorted(util.DETECTION_PROFILES), default="default",
+                        help="face detection/encoding speed profile")
+    args = parser.parse_args()
+
+    # streams are named by position, as CaptureManager does for a list of sources
+    names = [f"cam{index}" for index in range(len(args.source or []))]
+    for option in ('preview', 'monitor'):
+        name = getattr(args, option)
+        if name is not None and name not in names:
+            parser.error(f"--{option} {name}: no such stream, expected one of {names or 'none (pass --source)'}")
+    return args
+
+
 if __name__ == "__main__":
-    app = App()
+    args = parse_args()
+    app = App(sources=args.source, preview_stream=args.preview, monitor_stream=args.monitor,
+              profile=args.profile)
     app.start()
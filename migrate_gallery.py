@@ -0,0 +1,73 @@
+"""
+Build the packed gallery store (gallery_index.json + gallery_*.f32) from the
+per-user face_db/<user>/avg_encoding.pkl and multi_encodings.pkl files, or
+compact an existing store.
+
+    python migrate_gallery.py --db_dir face_db
+    python migrate_gallery.py --db_dir face_db --compact
+
+The per-user folders are left in place, so deleting gallery_index.json
+falls back to the old layout.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import util
+from GalleryStore import GalleryStore
+
+
+def migrate(db_dir):
+    known_encodings, known_names, multi_encodings_dict = util.load_legacy_faces(db_dir)
+    avg_by_name = dict(zip(known_names, known_encodings))
+    names = list(dict.fromkeys(known_names + list(multi_encodings_dict)))
+
+    store = GalleryStore(db_dir)
+    store.create((name, avg_by_name.get(name), multi_encodings_dict.get(name, [])) for name in names)
+    return store, avg_by_name, multi_encodings_dict
+
+
+def verify(store, avg_by_name, multi_encodings_dict):
+    """Check the store holds exactly the encodings read from the pickles"""
+    avg_matrix, avg_labels = store.load('avg')
+    for encoding, name in zip(avg_matrix, avg_labels):
+        if not np.allclose(encoding, avg_by_name[name], atol=1e-6):
+            return False
+    multi_matrix, multi_labels = store.load('multi')
+    expected = sum(len(encodings) for encodings in multi_encodings_dict.values())
+    return len(avg_labels) == len(avg_by_name) and len(multi_labels) == expected
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrate face_db to the packed gallery store")
+    parser.add_argument("--db_dir", type=str, default="face_db", help="face database directory")
+    parser.add_argument("--compact", action="store_true",
+                        help="rewrite an existing store without its removed rows")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.isdir(args.db_dir):
+        print(f"Database directory {args.db_dir} does not exist")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    if args.compact:
+        store = GalleryStore(args.db_dir)
+        if not store.exists():
+            print(f"No gallery store in {args.db_dir}, run without --compact first")
+            sys.exit(1)
+        store.compact()
+        print(f"Compacted gallery store in {time.perf_counter() - start:.2f}s")
+        sys.exit(0)
+
+    store, avg_by_name, multi_encodings_dict = migrate(args.db_dir)
+    ok = verify(store, avg_by_name, multi_encodings_dict)
+    print(f"{'✓' if ok else '✗'} Migrated {len(store.users())} users to {store.index_path} "
+          f"in {time.perf_counter() - start:.2f}s")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,119 @@
+"""
+Build INT8 versions of the anti-spoof models and check them against the
+float models.
+
+    python quantize_models.py --calib_dir ./images/calibration --eval_dir ./images/sample
+
+Calibration images can be model-sized crops (80x80) or full frames, in which
+case the face is detected and cropped at each model's scale. The harness
+then runs both ensembles over --eval_dir and reports how often the real/fake
+decisions agree, how far the confidences drift and the per-image latency.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from AntiSpoofHandler import AntiSpoofHandler
+from src.anti_spoof_predict import build_model
+from src.detection import Detection
+from src.generate_patches import CropImage
+from src.quantization import list_images, load_calibration_crops, quantize_model, save_quantized_model
+from src.utility import parse_model_name
+
+
+def quantize_all(model_dir, calib_dir, limit):
+    detector = Detection()
+    cropper = CropImage()
+    for model_name in sorted(f for f in os.listdir(model_dir) if f.endswith('.pth')):
+        model_path = os.path.join(model_dir, model_name)
+        h_input, w_input, _, scale = parse_model_name(model_name)
+        calibration_data = load_calibration_crops(calib_dir, h_input, w_input, scale,
+                                                  detector, cropper, limit)
+        model, _ = build_model(model_path, torch.device("cpu"))
+        quantized = quantize_model(model, calibration_data)
+        path = save_quantized_model(quantized, model_path, (h_input, w_input))
+        print(f"✓ {model_name} -> {os.path.basename(path)} "
+              f"(calibrated on {len(calibration_data)} crops)")
+
+
+def compare_with_float(model_dir, eval_dir, threshold):
+    """Run the float and INT8 ensembles over eval_dir and summarise the differences"""
+    float_handler = AntiSpoofHandler(model_dir, threshold=threshold, backend="torch")
+    int8_handler = AntiSpoofHandler(model_dir, threshold=threshold, backend="int8")
+    float_handler.debug_mode = False
+    int8_handler.debug_mode = False
+
+    paths = list_images(eval_dir)
+    if paths:
+        # first calls pay for TorchScript profiling, keep them out of the timings
+        warmup = cv2.imread(paths[0])
+        if warmup is not None:
+            for _ in range(3):
+                float_handler.is_real_face(warmup)
+                int8_handler.is_real_face(warmup)
+
+    rows = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        start = time.perf_counter()
+        float_real, float_conf, float_err = float_handler.is_real_face(image)
+        float_time = time.perf_counter() - start
+        start = time.perf_counter()
+        int8_real, int8_conf, int8_err = int8_handler.is_real_face(image)
+        int8_time = time.perf_counter() - start
+        if float_err or int8_err:
+            continue
+        rows.append((os.path.basename(path), bool(float_real), bool(int8_real),
+                     float_conf, int8_conf, float_time, int8_time))
+
+    if not rows:
+        print("No faces could be scored in the evaluation set")
+        return None
+
+    agreement = np.mean([r[1] == r[2] for r in rows])
+    conf_diff = np.abs([r[3] - r[4] for r in rows])
+    print(f"\nImages scored:        {len(rows)}")
+    print(f"Decision agreement:   {agreement * 100:.2f}%")
+    print(f"Confidence diff:      mean {conf_diff.mean():.4f}, max {conf_diff.max():.4f}")
+    print(f"Latency per image:    float {np.mean([r[5] for r in rows]) * 1000:.1f} ms, "
+          f"int8 {np.mean([r[6] for r in rows]) * 1000:.1f} ms")
+    for name, float_real, int8_real, float_conf, int8_conf, _, _ in rows:
+        if float_real != int8_real:
+            print(f"  mismatch {name}: float {'REAL' if float_real else 'FAKE'} ({float_conf:.3f}), "
+                  f"int8 {'REAL' if int8_real else 'FAKE'} ({int8_conf:.3f})")
+    return agreement
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Quantize anti-spoof models to INT8")
+    parser.add_argument("--model_dir", type=str, default="./resources/anti_spoof_models",
+                        help="directory containing the .pth models")
+    parser.add_argument("--calib_dir", type=str, required=True,
+                        help="folder of sample crops or frames used for calibration")
+    parser.add_argument("--eval_dir", type=str, default=None,
+                        help="folder of frames for the accuracy check (defaults to --calib_dir)")
+    parser.add_argument("--calib_limit", type=int, default=None,
+                        help="use at most this many calibration images")
+    parser.add_argument("--threshold", type=float, default=0.7,
+                        help="real-face threshold used for the decision comparison")
+    parser.add_argument("--min_agreement", type=float, default=0.98,
+                        help="fail if float/int8 decisions agree on fewer images than this")
+    parser.add_argument("--skip_quantize", action="store_true",
+                        help="only run the comparison against existing .int8.pt files")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.skip_quantize:
+        quantize_all(args.model_dir, args.calib_dir, args.calib_limit)
+    agreement = compare_with_float(args.model_dir, args.eval_dir or args.calib_dir, args.threshold)
+    sys.exit(0 if agreement is not None and agreement >= args.min_agreement else 1)
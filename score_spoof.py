@@ -0,0 +1,238 @@
+"""
+Offline anti-spoof scoring for image folders and recorded clips.
+
+    python score_spoof.py ./archive/snapshots ./archive/clip.mp4 --output scores.csv
+
+Images are decoded, face-detected and cropped in a worker pool; clips are
+decoded one frame at a time and each sampled frame is handed to the same
+pool, so only a bounded window of frames is held in memory. Crops are
+then scored in batches through every model in --model_dir. One row per
+image (or sampled video frame) is written to CSV or JSON, and throughput
+and latency percentiles are printed at the end.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from AntiSpoofHandler import AntiSpoofHandler
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# latency_ms is end to end (decode to result), queue_ms of it is spent waiting for a
+# batch to fill and inference_ms is the forward pass of the item's batch
+FIELDS = ['source', 'frame', 'status', 'is_real', 'label', 'confidence', 'real_score',
+          'bbox', 'latency_ms', 'queue_ms', 'inference_ms', 'error']
+
+
+def collect_inputs(paths):
+    """Expand files and directories into (kind, path) pairs, kind is 'image' or 'video'"""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                inputs.extend(collect_inputs(os.path.join(root, f) for f in sorted(files)))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            inputs.append(('image', path))
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            inputs.append(('video', path))
+    return inputs
+
+
+class BulkScorer:
+    def __init__(self, handler, batch_size):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.models = handler.model_registry.models()
+        self.pending = []
+        self.results = []
+
+    def prepare(self, source, frame_index, image, started):
+        """Detect the most confident face and crop it for every model (runs in the worker pool)"""
+        item = {'source': source, 'frame': frame_index, 'started': started}
+        if image is None:
+            item['status'] = 'unreadable'
+            return item
+        detections = self.handler.model_test.get_bboxes(image)
+        if not detections:
+            item['status'] = 'no_face'
+            return item
+        bbox, _ = detections[0]
+        item['bbox'] = bbox
+        item['crops'] = [
+            self.handler.image_cropper.crop(org_img=image, bbox=bbox, scale=spec.scale,
+                                            out_w=spec.w_input, out_h=spec.h_input,
+                                            crop=spec.scale is not None)
+            for spec in self.models
+        ]
+        item['status'] = 'ok'
+        item['prepared'] = time.perf_counter()
+        return item
+
+    @staticmethod
+    def iter_video_frames(path, every_n):
+        """Yield (frame_index, frame, started) for every every_n-th frame, decoding lazily"""
+        cap = cv2.VideoCapture(path)
+        frame_index = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                if frame_index % every_n:
+                    # skipped frames are grabbed but never decoded into an image
+                    if not cap.grab():
+                        break
+                else:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    yield frame_index, frame, started
+                frame_index += 1
+        finally:
+            cap.release()
+
+    def add(self, item):
+        if item['status'] != 'ok':
+            self._finish(item)
+            return
+        self.pending.append(item)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        started = time.perf_counter()
+        for item in batch:
+            item['queue_ms'] = (started - item.pop('prepared')) * 1000
+        try:
+            prediction = np.zeros((len(batch), 3))
+            for model_index, spec in enumerate(self.models):
+                crops = [item['crops'][model_index] for item in batch]
+                prediction += self.handler.model_test.predict_batch(crops, spec.path, spec.mtime)
+            prediction /= len(self.models)
+        except Exception as e:
+            # one bad batch must not cost the results of the whole run
+            print(f"Error scoring a batch of {len(batch)}: {e}")
+            for item in batch:
+                item['status'] = 'error'
+                item['error'] = str(e)
+                self._finish(item)
+            return
+        inference_ms = (time.perf_counter() - started) * 1000
+        for item, scores in zip(batch, prediction):
+            item['inference_ms'] = inference_ms
+            label = int(np.argmax(scores))
+            item['label'] = label
+            item['confidence'] = float(scores[label])
+            item['real_score'] = float(scores[1])
+            item['is_real'] = bool(label == 1 and scores[label] >= self.handler.threshold)
+            self._finish(item)
+
+    def _finish(self, item):
+        item['latency_ms'] = (time.perf_counter() - item.pop('started')) * 1000
+        item.pop('crops', None)
+        self.results.append(item)
+
+
+def write_results(results, output_path, output_format):
+    if output_format == 'json':
+        with open(output_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        return
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for row in results:
+            writer.writerow(row)
+
+
+def print_summary(results, elapsed):
+    scored = [r for r in results if r['status'] == 'ok']
+    real = sum(1 for r in scored if r['is_real'])
+    print(f"\nScored {len(scored)} of {len(results)} images in {elapsed:.1f}s "
+          f"({len(results) / elapsed:.1f} images/s)")
+    print(f"Real: {real}, Fake: {len(scored) - real}, "
+          f"No face: {sum(1 for r in results if r['status'] == 'no_face')}, "
+          f"Unreadable: {sum(1 for r in results if r['status'] == 'unreadable')}, "
+          f"Errors: {sum(1 for r in results if r['status'] == 'error')}")
+    for title, key in (('End-to-end latency', 'latency_ms'), ('Batch queue wait', 'queue_ms'),
+                       ('Batch inference', 'inference_ms')):
+        values = np.array([r[key] for r in results if key in r])
+        if len(values):
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            print(f"{title}: p50 {p50:.1f} ms, p90 {p90:.1f} ms, p99 {p99:.1f} ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk anti-spoof scoring")
+    parser.add_argument("inputs", nargs='+', help="image files, video files or directories")
+    parser.add_argument("--output", type=str, default="spoof_scores.csv",
+                        help="where to write per-image results")
+    parser.add_argument("--format", choices=['csv', 'json'], default=None,
+                        help="output format (default: from the --output extension)")
+    parser.add_argument("--model_dir", type=str, default="./resources/anti_spoof_models")
+    parser.add_argument("--backend", choices=AntiSpoofHandler.BACKENDS, default="torch")
+    parser.add_argument("--threshold", type=float, default=0.7, help="real-face threshold")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="decode/detect worker threads")
+    parser.add_argument("--batch_size", type=int, default=64, help="crops per forward pass")
+    parser.add_argument("--every_n", type=int, default=1, help="score every n-th video frame")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    output_format = args.format or ('json' if args.output.lower().endswith('.json') else 'csv')
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("No images or videos found")
+        sys.exit(1)
+
+    handler = AntiSpoofHandler(args.model_dir, threshold=args.threshold, backend=args.backend,
+                               hot_reload=False, max_sessions=args.workers)
+    handler.debug_mode = False
+    if not handler.models_loaded:
+        sys.exit(1)
+
+    scorer = BulkScorer(handler, args.batch_size)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        # keep a bounded window of decoded images / video frames in flight
+        in_flight = deque()
+
+        def submit(fn, *fn_args):
+            in_flight.append(executor.submit(fn, *fn_args))
+            while len(in_flight) > args.workers * 4:
+                scorer.add(in_flight.popleft().result())
+
+        for kind, path in inputs:
+            if kind == 'image':
+                submit(lambda p, t: scorer.prepare(p, None, cv2.imread(p), t), path, time.perf_counter())
+                continue
+            # clips are decoded here one frame at a time, the pool detects and crops them
+            decoded = False
+            for frame_index, frame, started in scorer.iter_video_frames(path, args.every_n):
+                decoded = True
+                submit(scorer.prepare, path, frame_index, frame, started)
+            if not decoded:
+                scorer.add({'source': path, 'frame': None, 'started': time.perf_counter(),
+                            'status': 'unreadable'})
+        while in_flight:
+            scorer.add(in_flight.popleft().result())
+    scorer.flush()
+    elapsed = time.perf_counter() - start
+
+    write_results(scorer.results, args.output, output_format)
+    print_summary(scorer.results, elapsed)
+    print(f"Results written to {args.output}")
@@ -6,8 +6,7 @@
 # @Software : PyCharm
 
 import os
-import cv2
-import math
+import threading
 import torch
 import numpy as np
 import torch.nn.functional as F
@@ -15,6 +14,8 @@ import torch.nn.functional as F
 
 from src.model_lib.MiniFASNet import MiniFASNetV1, MiniFASNetV2,MiniFASNetV1SE,MiniFASNetV2SE
 from src.data_io import transform as trans
+from src.detection import Detection
+from src.session_pool import SessionPool
 from src.utility import get_kernel, parse_model_name
 
 MODEL_MAPPING = {
@@ -24,80 +25,132 @@ MODEL_MAPPING = {
     'MiniFASNetV2SE':MiniFASNetV2SE
 }
 
+# session pools of the loaded networks, keyed by (model_path, device, variant, version),
+# shared by every predictor. version is the file's mtime as scanned by the ModelRegistry,
+# so a replaced file is loaded under a new key while the old entry keeps serving.
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def build_model(model_path, device):
+    model_name = os.path.basename(model_path)
+    h_input, w_input, model_type, _ = parse_model_name(model_name)
+    kernel_size = get_kernel(h_input, w_input,)
+    model = MODEL_MAPPING[model_type](conv6_kernel=kernel_size).to(device)
+
+    # load model weight
+    state_dict = torch.load(model_path, map_location=device)
+    keys = iter(state_dict)
+    first_layer_name = keys.__next__()
+    if first_layer_name.find('module.') >= 0:
+        from collections import OrderedDict
+        new_state_dict = OrderedDict()
+        for key, value in state_dict.items():
+            name_key = key[7:]
+            new_state_dict[name_key] = value
+        model.load_state_dict(new_state_dict)
+    else:
+        model.load_state_dict(state_dict)
+    model.eval()
+    return model, kernel_size
+
+
+def build_quantized_model(model_path):
+    from src.quantization import load_quantized_model
+    h_input, w_input, _, _ = parse_model_name(os.path.basename(model_path))
+    return load_quantized_model(model_path), get_kernel(h_input, w_input)
+
+
+def build_optimized_model(model_path, device):
+    from src.model_optimize import load_optimized_model
+    h_input, w_input, _, _ = parse_model_name(os.path.basename(model_path))
+    return load_optimized_model(model_path, device), get_kernel(h_input, w_input)
+
+
+def get_model_pool(model_path, device, quantized=False, optimize=False, max_sessions=2, version=None):
+    """Return the SessionPool of the model at model_path, loading it on first use only"""
+    variant = 'int8' if quantized else 'frozen' if optimize else 'float'
+    key = (os.path.abspath(model_path), str(device), variant, version)
+    pool = _MODEL_CACHE.get(key)
+    if pool is None:
+        with _MODEL_CACHE_LOCK:
+            pool = _MODEL_CACHE.get(key)
+            if pool is None:
+                if quantized:
+                    model, _ = build_quantized_model(model_path)
+                elif optimize:
+                    model, _ = build_optimized_model(model_path, device)
+                else:
+                    model, _ = build_model(model_path, device)
+                # an eval-mode module is read-only during forward, so every session is the
+                # same module and the pool only bounds how many forwards run at once
+                pool = SessionPool(lambda: model, max_sessions, initial=model)
+                _MODEL_CACHE[key] = pool
+    return pool
+
+
+def evict_model(model_path, version=None):
+    """Drop the cached variants of one version of model_path (every version when None)"""
+    path = os.path.abspath(model_path)
+    with _MODEL_CACHE_LOCK:
+        for key in [key for key in _MODEL_CACHE if key[0] == path and version in (None, key[3])]:
+            del _MODEL_CACHE[key]
+
+
+def clear_model_cache():
+    with _MODEL_CACHE_LOCK:
+        _MODEL_CACHE.clear()
 
-class Detection:
-    def __init__(self):
-        caffemodel = "./resources/detection_model/Widerface-RetinaFace.caffemodel"
-        deploy = "./resources/detection_model/deploy.prototxt"
-        self.detector = cv2.dnn.readNetFromCaffe(deploy, caffemodel)
-        self.detector_confidence = 0.6
 
-    def get_bbox(self, img):
-        height, width = img.shape[0], img.shape[1]
-        aspect_ratio = width / height
-        if img.shape[1] * img.shape[0] >= 192 * 192:
-            img = cv2.resize(img,
-                             (int(192 * math.sqrt(aspect_ratio)),
-                              int(192 / math.sqrt(aspect_ratio))), interpolation=cv2.INTER_LINEAR)
+class AntiSpoofPredict(Detection):
+    def __init__(self, device_id, quantized=False, optimize=True, max_sessions=2):
+        super(AntiSpoofPredict, self).__init__(max_sessions)
+        # concurrent forward passes allowed per model
+        self.max_sessions = max_sessions
+        # quantized kernels only exist on CPU
+        self.quantized = quantized
+        # fold BatchNorm and run a frozen TorchScript graph (see model_optimize.py)
+        self.optimize = optimize
+        self.device = torch.device("cuda:{}".format(device_id)
+                                   if torch.cuda.is_available() and not quantized else "cpu")
 
-        blob = cv2.dnn.blobFromImage(img, 1, mean=(104, 117, 123))
-        self.detector.setInput(blob, 'data')
-        out = self.detector.forward('detection_out').squeeze()
-        max_conf_index = np.argmax(out[:, 2])
-        left, top, right, bottom = out[max_conf_index, 3]*width, out[max_conf_index, 4]*height, \
-                                   out[max_conf_index, 5]*width, out[max_conf_index, 6]*height
-        bbox = [int(left), int(top), int(right-left+1), int(bottom-top+1)]
-        return bbox
+    def _pool(self, model_path, version=None):
+        return get_model_pool(model_path, self.device, self.quantized, self.optimize, self.max_sessions, version)
 
+    def preload(self, model_paths, version=None):
+        for model_path in model_paths:
+            self._pool(model_path, version)
 
-class AntiSpoofPredict(Detection):
-    def __init__(self, device_id):
-        super(AntiSpoofPredict, self).__init__()
-        self.device = torch.device("cuda:{}".format(device_id)
-                                   if torch.cuda.is_available() else "cpu")
-
-    def _load_model(self, model_path):
-        # define model
-        model_name = os.path.basename(model_path)
-        h_input, w_input, model_type, _ = parse_model_name(model_name)
-        self.kernel_size = get_kernel(h_input, w_input,)
-        self.model = MODEL_MAPPING[model_type](conv6_kernel=self.kernel_size).to(self.device)
-
-        # load model weight
-        state_dict = torch.load(model_path, map_location=self.device)
-        keys = iter(state_dict)
-        first_layer_name = keys.__next__()
-        if first_layer_name.find('module.') >= 0:
-            from collections import OrderedDict
-            new_state_dict = OrderedDict()
-            for key, value in state_dict.items():
-                name_key = key[7:]
-                new_state_dict[name_key] = value
-            self.model.load_state_dict(new_state_dict)
-        else:
-            self.model.load_state_dict(state_dict)
-        return None
-
-    def predict(self, img, model_path):
+    def unload(self, model_path, version=None):
+        evict_model(model_path, version)
+
+    def artifact_path(self, model_path):
+        """The file this predictor actually loads for model_path"""
+        if self.quantized:
+            from src.quantization import quantized_path_for
+            return quantized_path_for(model_path)
+        return model_path
+
+    def predict(self, img, model_path, version=None):
         test_transform = trans.Compose([
             trans.ToTensor(),
         ])
         img = test_transform(img)
         img = img.unsqueeze(0).to(self.device)
-        self._load_model(model_path)
-        self.model.eval()
-        with torch.no_grad():
-            result = self.model.forward(img)
+        with self._pool(model_path, version).session() as model, torch.no_grad():
+            result = model.forward(img)
             result = F.softmax(result).cpu().numpy()
         return result
 
-
-
-
-
-
-
-
-
-
-
+    def predict_batch(self, imgs, model_path, version=None):
+        """
+        Score a list of same-sized crops in one forward pass, returns (len(imgs), num_classes)
+
+        version: ModelSpec.mtime of the model, selects the loaded copy of that file
+        """
+        batch = np.ascontiguousarray(np.stack(imgs).transpose((0, 3, 1, 2)))
+        batch = torch.from_numpy(batch).float().to(self.device)
+        with self._pool(model_path, version).session() as model, torch.no_grad():
+            result = model.forward(batch)
+            result = F.softmax(result, dim=1).cpu().numpy()
+        return result
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# cv2.dnn backend for the MiniFASNet ensemble. Runs the ONNX files written by
+# export_onnx.py and never imports torch.
+
+import os
+import threading
+import cv2
+import numpy as np
+
+from src.detection import Detection
+from src.session_pool import SessionPool
+
+# session pools of loaded networks, keyed by (onnx path, version), version being the
+# file's mtime as scanned by the ModelRegistry. A cv2.dnn.Net holds its input and
+# activations, so each concurrent caller needs its own instance.
+_NET_CACHE = {}
+_NET_CACHE_LOCK = threading.Lock()
+
+
+def onnx_path_for(model_path):
+    """Map a .pth model path to the .onnx file exported next to it"""
+    return os.path.splitext(model_path)[0] + '.onnx'
+
+
+def get_net_pool(model_path, max_sessions=2, version=None):
+    onnx_path = onnx_path_for(model_path)
+    key = (os.path.abspath(onnx_path), version)
+    pool = _NET_CACHE.get(key)
+    if pool is None:
+        with _NET_CACHE_LOCK:
+            pool = _NET_CACHE.get(key)
+            if pool is None:
+                if not os.path.exists(onnx_path):
+                    raise FileNotFoundError(
+                        "{} not found, run export_onnx.py first".format(onnx_path))
+                pool = SessionPool(lambda: cv2.dnn.readNetFromONNX(onnx_path), max_sessions,
+                                   initial=cv2.dnn.readNetFromONNX(onnx_path))
+                _NET_CACHE[key] = pool
+    return pool
+
+
+def evict_net(model_path, version=None):
+    """Drop one version of model_path's net (every version when None)"""
+    path = os.path.abspath(onnx_path_for(model_path))
+    with _NET_CACHE_LOCK:
+        for key in [key for key in _NET_CACHE if key[0] == path and version in (None, key[1])]:
+            del _NET_CACHE[key]
+
+
+def clear_net_cache():
+    with _NET_CACHE_LOCK:
+        _NET_CACHE.clear()
+
+
+def softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class AntiSpoofPredictDNN(Detection):
+    """Same interface as AntiSpoofPredict, backed by cv2.dnn instead of torch"""
+
+    def __init__(self, device_id=0, max_sessions=2):
+        super(AntiSpoofPredictDNN, self).__init__(max_sessions)
+        self.device_id = device_id
+        self.max_sessions = max_sessions
+
+    def preload(self, model_paths, version=None):
+        for model_path in model_paths:
+            get_net_pool(model_path, self.max_sessions, version)
+
+    def unload(self, model_path, version=None):
+        evict_net(model_path, version)
+
+    def artifact_path(self, model_path):
+        """The file this predictor actually loads for model_path"""
+        return onnx_path_for(model_path)
+
+    def _forward(self, blob, model_path, version=None):
+        with get_net_pool(model_path, self.max_sessions, version).session() as net:
+            net.setInput(blob)
+            logits = net.forward()
+        return softmax(logits.reshape(blob.shape[0], -1))
+
+    def predict(self, img, model_path, version=None):
+        # the torch path feeds raw 0-255 BGR values, keep it identical here
+        blob = cv2.dnn.blobFromImage(img, 1.0, swapRB=False, crop=False)
+        return self._forward(blob, model_path, version)
+
+    def predict_batch(self, imgs, model_path, version=None):
+        blob = cv2.dnn.blobFromImages(imgs, 1.0, swapRB=False, crop=False)
+        return self._forward(blob, model_path, version)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# RetinaFace face detector, kept free of torch so the cv2.dnn backend can use it
+
+import cv2
+import math
+import numpy as np
+
+from src.session_pool import SessionPool
+
+
+class Detection:
+    # side of the square (in pixels) the input is resized to keep the area of
+    INPUT_SIZE = 192
+
+    def __init__(self, max_sessions=2):
+        caffemodel = "./resources/detection_model/Widerface-RetinaFace.caffemodel"
+        deploy = "./resources/detection_model/deploy.prototxt"
+        self.detector = cv2.dnn.readNetFromCaffe(deploy, caffemodel)
+        self.detector_confidence = 0.6
+        # a cv2.dnn.Net can't run two forward passes at once, give each caller its own
+        self.detector_pool = SessionPool(lambda: cv2.dnn.readNetFromCaffe(deploy, caffemodel),
+                                         max_sessions, initial=self.detector)
+
+    def _detect(self, img, input_size=None):
+        input_size = input_size or self.INPUT_SIZE
+        height, width = img.shape[0], img.shape[1]
+        aspect_ratio = width / height
+        if img.shape[1] * img.shape[0] >= input_size * input_size:
+            img = cv2.resize(img,
+                             (int(input_size * math.sqrt(aspect_ratio)),
+                              int(input_size / math.sqrt(aspect_ratio))), interpolation=cv2.INTER_LINEAR)
+
+        blob = cv2.dnn.blobFromImage(img, 1, mean=(104, 117, 123))
+        with self.detector_pool.session() as detector:
+            detector.setInput(blob, 'data')
+            out = detector.forward('detection_out').reshape(-1, 7)
+        return out, width, height
+
+    @staticmethod
+    def _to_bbox(row, width, height):
+        left, top, right, bottom = row[3]*width, row[4]*height, \
+                                   row[5]*width, row[6]*height
+        return [int(left), int(top), int(right-left+1), int(bottom-top+1)]
+
+    def get_bbox(self, img):
+        out, width, height = self._detect(img)
+        max_conf_index = np.argmax(out[:, 2])
+        return self._to_bbox(out[max_conf_index], width, height)
+
+    def get_bboxes(self, img, input_size=None, confidence=None):
+        """
+        Return [(bbox, confidence), ...] for every face above the confidence threshold, best first
+
+        input_size / confidence override INPUT_SIZE / detector_confidence for this call
+        """
+        out, width, height = self._detect(img, input_size)
+        out = out[out[:, 2] >= (self.detector_confidence if confidence is None else confidence)]
+        out = out[np.argsort(-out[:, 2])]
+        return [(self._to_bbox(row, width, height), float(row[2])) for row in out]
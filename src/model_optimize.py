@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Inference-time optimisation of the MiniFASNet models: BatchNorm is folded
+# into the preceding conv/linear weights, Dropout is removed, and the result
+# is traced and frozen to TorchScript. The frozen graph is cached next to the
+# .pth so later starts skip all of this.
+
+import json
+import os
+import torch
+from torch.nn import BatchNorm1d, Dropout, Identity
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+
+from src.anti_spoof_predict import build_model
+from src.model_lib.MiniFASNet import Conv_block, Linear_block, SEModule
+from src.utility import parse_model_name
+
+
+def frozen_path_for(model_path):
+    """Map a .pth model path to the frozen TorchScript file written next to it"""
+    return os.path.splitext(model_path)[0] + '.frozen.pt'
+
+
+def _source_stamp(model_path, device):
+    stat = os.stat(model_path)
+    return json.dumps({
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'device': str(device),
+        'torch': torch.__version__,
+    }, sort_keys=True)
+
+
+def fold_batchnorm(model):
+    """Fold every BatchNorm into the layer before it and drop Dropout, in place"""
+    for module in model.modules():
+        if isinstance(module, (Conv_block, Linear_block)):
+            module.conv = fuse_conv_bn_eval(module.conv, module.bn)
+            module.bn = Identity()
+        elif isinstance(module, SEModule):
+            module.fc1 = fuse_conv_bn_eval(module.fc1, module.bn1)
+            module.bn1 = Identity()
+            module.fc2 = fuse_conv_bn_eval(module.fc2, module.bn2)
+            module.bn2 = Identity()
+
+    # MiniFASNet head: linear -> bn -> drop -> prob. The linear layer is
+    # skipped when embedding_size == 512, so only fold when it is used.
+    if isinstance(getattr(model, 'bn', None), BatchNorm1d) and model.embedding_size != 512:
+        model.linear = fuse_linear_bn_eval(model.linear, model.bn)
+        model.bn = Identity()
+    for name, child in list(model.named_children()):
+        if isinstance(child, Dropout):
+            setattr(model, name, Identity())
+    return model
+
+
+def freeze_model(model, input_size, device):
+    example = torch.zeros(1, 3, *input_size, device=device)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    return torch.jit.freeze(traced.eval())
+
+
+def _outputs_match(reference, optimized, input_size, device, atol=1e-3):
+    sample = torch.rand(2, 3, *input_size, device=device) * 255
+    with torch.no_grad():
+        expected = torch.softmax(reference(sample), dim=1)
+        actual = torch.softmax(optimized(sample), dim=1)
+    return torch.allclose(expected, actual, atol=atol)
+
+
+def load_optimized_model(model_path, device):
+    """
+    Return a frozen TorchScript version of the model at model_path
+
+    Reuses the cached .frozen.pt when it was built from the same .pth on the
+    same device and torch version, otherwise rebuilds it from the .pth,
+    checks it against the float model and refreshes the cache. Falls back to
+    the float model if the optimised graph disagrees with it.
+    """
+    frozen_path = frozen_path_for(model_path)
+    stamp = _source_stamp(model_path, device)
+
+    if os.path.exists(frozen_path):
+        extra_files = {'source': ''}
+        try:
+            model = torch.jit.load(frozen_path, map_location=device, _extra_files=extra_files)
+            source = extra_files['source']
+            if isinstance(source, bytes):
+                source = source.decode('utf-8')
+            if source == stamp:
+                return model
+        except Exception as e:
+            print(f"Ignoring unreadable frozen model {frozen_path}: {e}")
+
+    h_input, w_input, _, _ = parse_model_name(os.path.basename(model_path))
+    reference, _ = build_model(model_path, device)
+    folded, _ = build_model(model_path, device)
+    frozen = freeze_model(fold_batchnorm(folded), (h_input, w_input), device)
+
+    if not _outputs_match(reference, frozen, (h_input, w_input), device):
+        print(f"WARNING: optimised {os.path.basename(model_path)} disagrees with the float model, using float")
+        return reference
+
+    try:
+        torch.jit.save(frozen, frozen_path, _extra_files={'source': stamp})
+    except OSError as e:
+        print(f"Could not cache frozen model at {frozen_path}: {e}")
+    return frozen
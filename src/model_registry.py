@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Registry of the anti-spoof models in a directory. The directory is scanned
+# once and each model's input size, type and crop scale are parsed up front.
+# An optional watcher thread picks up added, removed or replaced .pth files
+# and swaps in a new snapshot without restarting the app.
+
+import os
+import threading
+from collections import namedtuple
+
+from src.utility import parse_model_name
+
+ModelSpec = namedtuple('ModelSpec', ['name', 'path', 'h_input', 'w_input', 'model_type', 'scale', 'mtime'])
+
+
+class ModelRegistry:
+    def __init__(self, model_dir, artifact_path=None, on_load=None, on_unload=None, poll_interval=10.0):
+        """
+        Args:
+            model_dir: directory holding the .pth models
+            artifact_path: maps a .pth path to the file the backend actually loads
+                           (e.g. the exported .onnx); its mtime is what gets watched
+            on_load: called with a ModelSpec before it is published, used to warm it up;
+                     if it raises, the previous version (if any) stays published
+            on_unload: called with a ModelSpec after the snapshot without it is
+                       published, so the backend must key loaded models by
+                       (path, mtime) for the replacement to load alongside it
+            poll_interval: seconds between directory checks of the watcher thread
+        """
+        self.model_dir = model_dir
+        self.artifact_path = artifact_path or (lambda path: path)
+        self.on_load = on_load
+        self.on_unload = on_unload
+        self.poll_interval = poll_interval
+
+        self._models = ()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+    def models(self):
+        """Current snapshot of ModelSpecs; safe to iterate while a reload happens"""
+        return self._models
+
+    def _scan(self):
+        specs = {}
+        for name in sorted(os.listdir(self.model_dir)):
+            if not name.endswith('.pth'):
+                continue
+            path = os.path.join(self.model_dir, name)
+            try:
+                h_input, w_input, model_type, scale = parse_model_name(name)
+                artifact = self.artifact_path(path)
+                mtime = os.path.getmtime(artifact if os.path.exists(artifact) else path)
+            except (ValueError, IndexError, OSError) as e:
+                print(f"Skipping model file {name}: {e}")
+                continue
+            specs[name] = ModelSpec(name, path, h_input, w_input, model_type, scale, mtime)
+        return specs
+
+    def refresh(self):
+        """
+        Rescan the directory and publish a new snapshot if anything changed
+
+        Returns:
+            bool: True if the set of models changed
+        """
+        with self._refresh_lock:
+            if not os.path.isdir(self.model_dir):
+                print(f"ERROR: Model directory does not exist: {self.model_dir}")
+                return False
+
+            current = {spec.name: spec for spec in self._models}
+            scanned = self._scan()
+            if scanned == current:
+                return False
+
+            # Warm every new or replaced model before anyone can see it
+            for spec in [spec for name, spec in scanned.items() if current.get(name) != spec]:
+                if self.on_load:
+                    try:
+                        self.on_load(spec)
+                    except Exception as e:
+                        previous = current.get(spec.name)
+                        if previous is not None:
+                            # e.g. a half-copied file, keep serving the old one and retry next scan
+                            print(f"ERROR loading model {spec.name}, keeping the previous version: {e}")
+                            scanned[spec.name] = previous
+                        else:
+                            print(f"ERROR loading model {spec.name}, leaving it out: {e}")
+                            del scanned[spec.name]
+
+            if scanned == current:
+                return False
+            self._models = tuple(scanned.values())
+
+            # Only release removed / replaced models once the new snapshot is live
+            for name, spec in current.items():
+                if scanned.get(name) != spec and self.on_unload:
+                    self.on_unload(spec)
+
+            if current:
+                print(f"Anti-spoof models reloaded: {[spec.name for spec in self._models]}")
+            return True
+
+    def start_watching(self):
+        if self._watcher is not None:
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop_event.set()
+        self._watcher = None
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"ERROR while checking for model updates: {e}")
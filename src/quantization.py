@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Post-training static INT8 quantization for the MiniFASNet models.
+#
+# FX graph mode is used rather than eager mode because the residual adds and
+# the SE multiply in MiniFASNet.py are plain tensor ops; FX quantizes them
+# without rewriting the model code. prepare_fx folds every conv+BN pair in
+# Conv_block, Linear_block and SEModule. PyTorch has no fused conv+BN+PReLU
+# kernel, and its standalone quantized PReLU gives wrong outputs for these
+# models, so PReLU is left in float between the INT8 convolutions.
+
+import os
+import cv2
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.fx.custom_config import PrepareCustomConfig
+from torch.nn import Module, PReLU
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def quantized_path_for(model_path):
+    """Map a .pth model path to the INT8 TorchScript file written next to it"""
+    return os.path.splitext(model_path)[0] + '.int8.pt'
+
+
+def select_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError(f"No quantized engine available (supported: {engines})")
+
+
+def list_images(folder):
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def load_calibration_crops(folder, h_input, w_input, scale=None, detector=None, cropper=None, limit=None):
+    """
+    Load calibration inputs for one model as an (N, 3, h, w) float32 array
+
+    Images that already have the model's input size are used as they are.
+    Larger frames are cropped around the detected face at the model's scale
+    when a detector and cropper are given, otherwise they are resized.
+    """
+    crops = []
+    for path in list_images(folder)[:limit]:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        if img.shape[:2] != (h_input, w_input):
+            if detector is not None and cropper is not None:
+                img = cropper.crop(org_img=img, bbox=detector.get_bbox(img), scale=scale,
+                                   out_w=w_input, out_h=h_input, crop=scale is not None)
+            else:
+                img = cv2.resize(img, (w_input, h_input))
+        crops.append(img.transpose((2, 0, 1)))
+    if not crops:
+        raise ValueError(f"No calibration images found in {folder}")
+    return np.stack(crops).astype(np.float32)
+
+
+class FloatPReLU(Module):
+    """Opaque wrapper that keeps a PReLU out of quantization"""
+
+    def __init__(self, prelu):
+        super(FloatPReLU, self).__init__()
+        self.prelu = prelu
+
+    def forward(self, x):
+        return self.prelu(x)
+
+
+def wrap_prelu(module):
+    for name, child in module.named_children():
+        if isinstance(child, PReLU):
+            setattr(module, name, FloatPReLU(child))
+        else:
+            wrap_prelu(child)
+    return module
+
+
+def quantize_model(model, calibration_data, batch_size=32):
+    """Return a converted INT8 copy of a float model calibrated on (N, 3, h, w) inputs"""
+    engine = select_engine()
+    model = wrap_prelu(model.cpu().eval())
+    example_inputs = (torch.from_numpy(calibration_data[:1]),)
+    qconfig_mapping = get_default_qconfig_mapping(engine).set_object_type(FloatPReLU, None)
+    custom_config = PrepareCustomConfig().set_non_traceable_module_classes([FloatPReLU])
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs, prepare_custom_config=custom_config)
+    with torch.no_grad():
+        for start in range(0, len(calibration_data), batch_size):
+            prepared(torch.from_numpy(calibration_data[start:start + batch_size]))
+    return convert_fx(prepared)
+
+
+def save_quantized_model(quantized_model, model_path, input_size):
+    """Trace the INT8 model to TorchScript and write it next to the .pth"""
+    example = torch.zeros(1, 3, *input_size)
+    with torch.no_grad():
+        scripted = torch.jit.trace(quantized_model, example)
+    path = quantized_path_for(model_path)
+    torch.jit.save(scripted, path)
+    return path
+
+
+def load_quantized_model(model_path):
+    path = quantized_path_for(model_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, run quantize_models.py first")
+    select_engine()
+    model = torch.jit.load(path, map_location="cpu")
+    model.eval()
+    return model
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Bounded pool of inference sessions. Each caller checks a session out, runs
+# it, and returns it, and only waits when every session is busy. Stateful
+# sessions (cv2.dnn nets) get a new instance per slot; read-only ones (eval
+# torch modules) can hand out the same object from the factory, and the pool
+# then just bounds how many callers use it at once.
+
+import threading
+from contextlib import contextmanager
+
+
+class SessionPool:
+    def __init__(self, factory, max_sessions=2, initial=None):
+        """
+        Args:
+            factory: callable returning a new session, only called while the pool
+                     has fewer than max_sessions sessions
+            max_sessions: upper bound on sessions alive at once
+            initial: optional already-built session to seed the pool with
+        """
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        if initial is not None:
+            self._idle.append(initial)
+            self._created = 1
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            while not self._idle and self._created >= self.max_sessions:
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("No inference session became available")
+            if self._idle:
+                return self._idle.pop()
+            # reserve the slot, build outside the lock
+            self._created += 1
+
+        try:
+            return self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, session):
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout=None):
+        session = self.acquire(timeout)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_sessions': self.max_sessions,
+                'created': self._created,
+                'idle': len(self._idle),
+            }
@@ -1,34 +1,69 @@
 import os
-import json
 import tkinter as tk
 from tkinter import messagebox
 import face_recognition
 import cv2
-import numpy as np
 import pickle
+from collections import namedtuple
+
+from FaceGallery import FaceGallery
+from FrameBus import Frame, as_frame
+from GalleryStore import GalleryStore
+from UserDirectory import UserDirectory
+
+# Match tolerances: average encodings (login/logout) and per-pose multi encodings (timer)
+AVG_TOLERANCE = 0.41
+MULTI_TOLERANCE = 0.62
+
+# How faces are found and encoded.
+# RetinaFace (FaceDetector, what the app uses):
+#   input_size: side of the square whose area the frame is resized to before detection,
+#               larger finds smaller / more distant faces at a higher cost
+#   confidence: detections below this score are dropped
+# dlib (detect_face_locations, only when util.recognize has to detect a frame itself):
+#   scale: detect on the frame resized by this factor, boxes are mapped back
+#   model: 'hog' (CPU) or 'cnn' (dlib CNN detector, slow without CUDA)
+#   upsample: times the (scaled) image is upsampled while detecting, finds smaller faces
+# Encoding (both), always on the full-resolution frame:
+#   landmarks: 'small' (5-point) or 'large' (68-point) model used to align before encoding
+#   jitters: times each face is re-sampled and averaged while encoding
+DetectionProfile = namedtuple('DetectionProfile', ['input_size', 'confidence', 'scale', 'model', 'upsample',
+                                                   'landmarks', 'jitters'])
+
+DETECTION_PROFILES = {
+    # RetinaFace / face_recognition defaults, what registration and anti-spoofing use
+    'default': DetectionProfile(192, 0.6, 1.0, 'hog', 1, 'small', 1),
+    'balanced': DetectionProfile(160, 0.6, 0.5, 'hog', 1, 'small', 1),
+    'fast': DetectionProfile(128, 0.7, 0.25, 'hog', 1, 'small', 1),
+    'cnn': DetectionProfile(256, 0.6, 0.5, 'cnn', 1, 'small', 1),
+    'precise': DetectionProfile(320, 0.5, 1.0, 'hog', 1, 'large', 3),
+}
+
+
+def get_profile(profile):
+    """Accept a profile name, a DetectionProfile, or None for 'default'"""
+    if profile is None:
+        return DETECTION_PROFILES['default']
+    if isinstance(profile, str):
+        return DETECTION_PROFILES[profile]
+    return profile
 
 
 def match_face(current_encoding, known_encodings, known_names, tolerance=0.40):
-    if not known_encodings:
-        return "Unknown"
+    # strict, as this helper always compared distance < tolerance
+    match = FaceGallery(known_encodings, known_names).match(current_encoding, tolerance, inclusive=False)
+    return match.name if match else "Unknown"
 
-    face_distances = face_recognition.face_distance(known_encodings, current_encoding)
-    best_match_index = np.argmin(face_distances)
 
-    if face_distances[best_match_index] < tolerance:
-        return known_names[best_match_index]
-    else:
-        return "Unknown"
+def match_face_multi(current_encoding, multi_encodings_dict, tolerance=MULTI_TOLERANCE):
+    match = FaceGallery.from_multi(multi_encodings_dict).match(current_encoding, tolerance)
+    return match.name if match else "Unknown"
 
 
-def match_face_multi(current_encoding, multi_encodings_dict, tolerance=0.62):
-    for name, encodings in multi_encodings_dict.items():
-        if not encodings:
-            continue
-        matches = face_recognition.compare_faces(encodings, current_encoding, tolerance)
-        if any(matches):
-            return name
-    return "Unknown"
+def get_emp_id(db_dir, name, user_directory=None):
+    if user_directory is None:
+        user_directory = UserDirectory(os.path.join(db_dir, 'users.json'))
+    return user_directory.get_emp_id(name)
 
 
 def get_button(window, text, color, command, fg='white'):
@@ -58,94 +93,181 @@ def msg_box(title, description):
     messagebox.showinfo(title, description)
 
 
-def recognize(frame, db_dir, known_encodings=None, known_names=None, use_multi_encodings=False):
+def _rgb(image):
+    """RGB array of a Frame (converted once per frame) or an array that is already RGB"""
+    return image.rgb if isinstance(image, Frame) else image
+
+
+def detect_face_locations(rgb_frame, profile=None):
     """
-    Enhanced face recognition with proper error handling
+    face_recognition (top, right, bottom, left) boxes in full-frame coordinates,
+    detected as configured by profile (see DETECTION_PROFILES)
+    rgb_frame: RGB array, or a Frame whose cached RGB / downscaled forms are used
+    """
+    profile = get_profile(profile)
+    if profile.scale == 1.0:
+        return face_recognition.face_locations(_rgb(rgb_frame), profile.upsample, profile.model)
+
+    if isinstance(rgb_frame, Frame):
+        small = rgb_frame.resized(scale=profile.scale, color='rgb')
+    else:
+        small = cv2.resize(rgb_frame, (0, 0), fx=profile.scale, fy=profile.scale, interpolation=cv2.INTER_AREA)
+    height, width = rgb_frame.shape[:2]
+    return [
+        (max(int(top / profile.scale), 0), min(int(right / profile.scale), width),
+         min(int(bottom / profile.scale), height), max(int(left / profile.scale), 0))
+        for top, right, bottom, left in face_recognition.face_locations(small, profile.upsample, profile.model)
+    ]
+
+
+def encode_faces(rgb_frame, face_locations, profile=None):
+    profile = get_profile(profile)
+    return face_recognition.face_encodings(_rgb(rgb_frame), face_locations, profile.jitters, profile.landmarks)
+
+
+def get_single_face_encoding(frame, faces=None, profile=None):
+    """
+    Returns (status, encoding) for the single face in the frame. status is None on
+    success, otherwise 'no_persons_found' or 'multiple_faces_detected'.
+    frame: BGR array or Frame.
+    If faces (DetectedFace objects from FaceDetector) are given, detection is skipped.
+    profile: DETECTION_PROFILES name or DetectionProfile used when detecting here.
     """
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    face_locations = face_recognition.face_locations(rgb_frame)
+    if faces is not None:
+        if len(faces) == 0:
+            return 'no_persons_found', None
+        if len(faces) > 1:
+            return 'multiple_faces_detected', None
+        encoding = faces[0].encoding
+        if encoding is None:
+            return 'no_persons_found', None
+        return None, encoding
+
+    frame = as_frame(frame)
+    face_locations = detect_face_locations(frame, profile)
 
     if len(face_locations) == 0:
         return 'no_persons_found', None
     if len(face_locations) > 1:
         return 'multiple_faces_detected', None
 
-    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    face_encodings = encode_faces(frame, face_locations, profile)
     if not face_encodings:
         return 'no_persons_found', None
 
-    encoding = face_encodings[0]
+    return None, face_encodings[0]
 
-    if use_multi_encodings:
-        # Load multi-encodings for better accuracy during timer checks
-        multi_encodings_dict = {}
-
-        for user in os.listdir(db_dir):
-            user_path = os.path.join(db_dir, user)
-            if not os.path.isdir(user_path):
-                continue
-
-            # Load multi_encodings.pkl (contains 5 poses)
-            multi_path = os.path.join(user_path, 'multi_encodings.pkl')
-            if os.path.exists(multi_path):
-                try:
-                    with open(multi_path, 'rb') as f:
-                        encodings = pickle.load(f)
-                        multi_encodings_dict[user] = encodings
-                except:
-                    pass
-
-        # Find match using multi encodings
-        matched_user = match_face_multi(encoding, multi_encodings_dict, tolerance=0.62)
-
-        if matched_user != "Unknown":
-            # Get emp_id
-            users_file = os.path.join(db_dir, 'users.json')
+
+def get_face_encodings(frame, profile=None):
+    """Encodings of every face in a BGR frame or Frame, in the order dlib detected them"""
+    frame = as_frame(frame)
+    face_locations = detect_face_locations(frame, profile)
+    if not face_locations:
+        return []
+    return encode_faces(frame, face_locations, profile)
+
+
+def load_multi_encodings(db_dir):
+    """Read every user's multi_encodings.pkl (5 poses) into {name: encodings}"""
+    multi_encodings_dict = {}
+
+    for user in os.listdir(db_dir):
+        user_path = os.path.join(db_dir, user)
+        if not os.path.isdir(user_path):
+            continue
+
+        multi_path = os.path.join(user_path, 'multi_encodings.pkl')
+        if os.path.exists(multi_path):
             try:
-                with open(users_file, 'r') as f:
-                    users_data = json.load(f)
-                emp_id = users_data.get(matched_user, "N/A")
+                with open(multi_path, 'rb') as f:
+                    multi_encodings_dict[user] = pickle.load(f)
             except:
-                emp_id = "N/A"
-            return matched_user, emp_id
-        else:
-            return 'unknown_person', None
+                pass
+
+    return multi_encodings_dict
+
+
+def recognize(frame, db_dir, known_encodings=None, known_names=None, use_multi_encodings=False, faces=None,
+              gallery=None, multi_gallery=None, user_directory=None, profile=None):
+    """
+    Enhanced face recognition with proper error handling
+    frame: BGR array or Frame (a Frame shares its RGB conversion with other consumers).
+    Pass faces from FaceDetector.detect to reuse an existing detection of the frame.
+    Pass gallery / multi_gallery (FaceGallery of the average / multi encodings,
+    e.g. RecognitionHandler's) to match in memory; without multi_gallery every
+    user's multi_encodings.pkl is read from disk.
+    Pass user_directory (a UserDirectory) to look up emp_ids without re-reading users.json.
+    profile selects the detection/encoding settings when faces is not given (see DETECTION_PROFILES).
+    """
+    status, encoding = get_single_face_encoding(frame, faces, profile)
+    if status is not None:
+        return status, None
+
+    if use_multi_encodings:
+        if multi_gallery is None:
+            multi_gallery = FaceGallery.from_multi(load_multi_encodings(db_dir))
+
+        # Closest match over all users' encodings at once
+        match = multi_gallery.match(encoding, tolerance=MULTI_TOLERANCE)
 
     else:
-        # Original single encoding logic for login/logout - FIXED
-        if not known_encodings or not known_names:
-            return 'unknown_person', None
+        # Single average encoding per user for login/logout
+        if gallery is None:
+            if not known_encodings or not known_names:
+                return 'unknown_person', None
 
-        # Ensure both lists have the same length
-        if len(known_encodings) != len(known_names):
-            print(f"Warning: Mismatch between encodings ({len(known_encodings)}) and names ({len(known_names)})")
-            return 'unknown_person', None
+            # Ensure both lists have the same length
+            if len(known_encodings) != len(known_names):
+                print(f"Warning: Mismatch between encodings ({len(known_encodings)}) and names ({len(known_names)})")
+                return 'unknown_person', None
 
-        matches = face_recognition.compare_faces(known_encodings, encoding, tolerance=0.41)
+            gallery = FaceGallery(known_encodings, known_names)
 
-        if not any(matches):
-            return 'unknown_person', None
+        match = gallery.match(encoding, tolerance=AVG_TOLERANCE)
 
-        # Find the first True match
-        try:
-            matched_idx = matches.index(True)
-            matched_user = known_names[matched_idx]
+    if match is None:
+        return 'unknown_person', None
+    return match.name, get_emp_id(db_dir, match.name, user_directory)
 
-            # Get emp_id
-            users_file = os.path.join(db_dir, 'users.json')
-            try:
-                with open(users_file, 'r') as f:
-                    users_data = json.load(f)
-                emp_id = users_data.get(matched_user, "N/A")
-            except:
-                emp_id = "N/A"
-            return matched_user, emp_id
-        except (ValueError, IndexError) as e:
-            print(f"Error finding match: {e}")
-            return 'unknown_person', None
+
+def load_store_matrices(store):
+    """
+    (avg_matrix, avg_labels, multi_matrix, multi_labels) from a GalleryStore,
+    or None if it can't be read
+    """
+    try:
+        avg_matrix, avg_labels = store.load('avg')
+        multi_matrix, multi_labels = store.load('multi')
+    except (OSError, ValueError) as e:
+        print(f"Error loading gallery store, falling back to per-user files: {e}")
+        return None
+    print(f"Loaded gallery store: {len(avg_labels)} users, {len(multi_labels)} multi-encodings")
+    return avg_matrix, avg_labels, multi_matrix, multi_labels
+
+
+def faces_from_matrices(avg_matrix, avg_labels, multi_matrix, multi_labels):
+    """load_known_faces-style lists and dict whose encodings are row views of the matrices"""
+    multi_encodings_dict = {}
+    for encoding, name in zip(multi_matrix, multi_labels):
+        multi_encodings_dict.setdefault(name, []).append(encoding)
+    return list(avg_matrix), list(avg_labels), multi_encodings_dict
 
 
 def load_known_faces(db_path):
+    """
+    Load average and multi encodings, from the packed gallery store when
+    face_db has been migrated (see migrate_gallery.py), otherwise from the
+    per-user pickle folders. Encodings from the store are views into its
+    memory-mapped files.
+    """
+    store = GalleryStore(db_path)
+    matrices = load_store_matrices(store) if store.exists() else None
+    if matrices is None:
+        return load_legacy_faces(db_path)
+    return faces_from_matrices(*matrices)
+
+
+def load_legacy_faces(db_path):
     """
     Enhanced to load both average and multi encodings with proper error handling
     """